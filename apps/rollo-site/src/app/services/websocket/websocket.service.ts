@@ -87,16 +87,21 @@ export class WebSocketService {
 
         this.socket.onmessage = (event) => {
           try {
-            const message: WebSocketMessage = JSON.parse(event.data);
-            this.log('Received message:', message);
+            // The server coalesces bursts into a JSON array of messages
+            const parsed: WebSocketMessage | WebSocketMessage[] = JSON.parse(event.data);
+            const messages = Array.isArray(parsed) ? parsed : [parsed];
             
-            // Handle special message types
-            if (message.type === WebSocketEventType.PONG) {
-              this.log('Received pong response');
-              return;
+            for (const message of messages) {
+              this.log('Received message:', message);
+              
+              // Handle special message types
+              if (message.type === WebSocketEventType.PONG) {
+                this.log('Received pong response');
+                continue;
+              }
+              
+              this.messagesSubject.next(message);
             }
-            
-            this.messagesSubject.next(message);
           } catch (error) {
             this.log('Error parsing message:', error);
           }
@@ -1,5 +1,6 @@
 """Server management API endpoints."""
 
+import time
 from typing import List, Optional
 from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException, Query, status
@@ -300,6 +301,8 @@ async def discover_servers(
             scan_duration=scan_duration,
             total_found=len(discovered_ips)
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Server discovery failed: {e}")
         raise HTTPException(
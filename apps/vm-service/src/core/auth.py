@@ -14,6 +14,15 @@ security = HTTPBearer()
 
 SSO_BASE_URL = "http://127.0.0.1:3000/api/auth"
 
+# Permissions granted per SSO access level. Built once and shared by every
+# user with that level; frozensets make membership checks O(1).
+ACCESS_LEVEL_PERMISSIONS = {
+    "admin": frozenset({"read", "write", "delete", "admin"}),
+    "premium": frozenset({"read", "write"}),
+    "standard": frozenset({"read"}),
+}
+NO_PERMISSIONS = frozenset()
+
 
 class AuthenticationError(HTTPException):
     """Custom authentication error."""
@@ -50,15 +59,7 @@ async def fetch_user_from_sso(token: str) -> dict:
             if "accessLevel" in user:
                 print(f"Mapping access_level: {user['accessLevel']}")
                 # Map access_level to permissions
-                level = user["accessLevel"]
-                if level == "admin":
-                    user["permissions"] = ["read", "write", "delete", "admin"]
-                elif level == "premium":
-                    user["permissions"] = ["read", "write"]
-                elif level == "standard":
-                    user["permissions"] = ["read"]
-                else:
-                    user["permissions"] = []
+                user["permissions"] = ACCESS_LEVEL_PERMISSIONS.get(user["accessLevel"], NO_PERMISSIONS)
             return user
         except httpx.HTTPStatusError as e:
             logger.warning(f"SSO user fetch failed: {e.response.text}")
@@ -86,19 +87,21 @@ async def get_current_active_user(current_user: dict = Depends(get_current_user)
 
 def require_roles(roles: List[str]):
     """Decorator to require specific roles."""
+    required_roles = frozenset(roles)
+
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
             current_user = kwargs.get("current_user")
             if not current_user:
                 raise AuthenticationError("Authentication required")
-            user_roles = set()
+            user_roles = ()
             # SSO returns 'accessLevel' or 'roles'
             if "roles" in current_user:
-                user_roles = set(current_user["roles"])
+                user_roles = current_user["roles"]
             elif "accessLevel" in current_user:
-                user_roles = {current_user["accessLevel"]}
-            missing_roles = set(roles) - user_roles
+                user_roles = (current_user["accessLevel"],)
+            missing_roles = required_roles.difference(user_roles)
             if missing_roles:
                 logger.warning(
                     f"User {current_user.get('username')} missing roles: {missing_roles}"
@@ -114,14 +117,15 @@ def require_roles(roles: List[str]):
 # If you want to support permissions, adapt this function to your SSO user schema
 def require_permissions(permissions: List[str]):
     """Decorator to require specific permissions."""
+    required_permissions = frozenset(permissions)
+
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
             current_user = kwargs.get("current_user")
             if not current_user:
                 raise AuthenticationError("Authentication required")
-            user_permissions = set(current_user.get("permissions", []))
-            missing_permissions = set(permissions) - user_permissions
+            missing_permissions = required_permissions.difference(current_user.get("permissions", ()))
             if missing_permissions:
                 logger.warning(
                     f"User {current_user.get('username')} missing permissions: {missing_permissions}"
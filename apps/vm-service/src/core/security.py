@@ -1,7 +1,13 @@
 """Security utilities for JWT authentication and password hashing."""
 
+import base64
+import hashlib
+import hmac
+import json
 import secrets
+from calendar import timegm
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import Optional, Dict, Any
 
 from jose import JWTError, jwt
@@ -15,6 +21,45 @@ from .config import settings
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
+def _b64url(data: bytes) -> bytes:
+    """Base64url-encode without padding, as JWT requires."""
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+# Every HS256 token carries the same header, so it is encoded only once.
+_HS256_HEADER_B64 = _b64url(
+    json.dumps({"alg": "HS256", "typ": "JWT"}, separators=(",", ":"), sort_keys=True).encode("utf-8")
+)
+
+
+@lru_cache(maxsize=None)
+def _hs256_key_schedule(key: str) -> "hmac.HMAC":
+    """Keyed HMAC-SHA256 template; callers must ``copy()`` it before use."""
+    return hmac.new(key.encode("utf-8"), digestmod=hashlib.sha256)
+
+
+def _encode_jwt(claims: Dict[str, Any]) -> str:
+    """Encode claims as a signed JWT.
+
+    HS256 is specialised: the header is precomputed and the keyed HMAC
+    state is copied instead of re-deriving the inner/outer pads per token.
+    Output is byte-identical to ``jose.jwt.encode``. Other algorithms go
+    through python-jose.
+    """
+    if settings.algorithm != "HS256":
+        return jwt.encode(claims, settings.secret_key, algorithm=settings.algorithm)
+
+    for time_claim in ("exp", "iat", "nbf"):
+        if isinstance(claims.get(time_claim), datetime):
+            claims[time_claim] = timegm(claims[time_claim].utctimetuple())
+
+    payload = _b64url(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    signing_input = _HS256_HEADER_B64 + b"." + payload
+    signer = _hs256_key_schedule(settings.secret_key).copy()
+    signer.update(signing_input)
+    return (signing_input + b"." + _b64url(signer.digest())).decode("utf-8")
+
+
 class TokenData(BaseModel):
     """Token data model."""
     username: Optional[str] = None
@@ -47,7 +92,7 @@ class SecurityUtils:
             expire = datetime.now(timezone.utc) + timedelta(minutes=15)
             
         to_encode.update({"exp": expire, "type": "access"})
-        encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
+        encoded_jwt = _encode_jwt(to_encode)
         return encoded_jwt
 
     @staticmethod
@@ -61,7 +106,7 @@ class SecurityUtils:
             expire = datetime.now(timezone.utc) + timedelta(days=7)
             
         to_encode.update({"exp": expire, "type": "refresh"})
-        encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
+        encoded_jwt = _encode_jwt(to_encode)
         return encoded_jwt
 
     @staticmethod
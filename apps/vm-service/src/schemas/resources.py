@@ -1,7 +1,7 @@
 """Resource configuration schemas for VM management."""
 
 from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ConfigDict
 from enum import Enum
 
 
@@ -43,6 +43,8 @@ class MemoryConfig(BaseModel):
 
 class DiskConfig(BaseModel):
     """Disk configuration schema."""
+    model_config = ConfigDict(frozen=True)
+
     name: str = Field(..., description="Disk name/identifier")
     size_gb: float = Field(..., ge=1.0, le=2000.0, description="Disk size in GB")
     format: DiskFormat = Field(DiskFormat.QCOW2, description="Disk format")
@@ -56,6 +58,8 @@ class DiskConfig(BaseModel):
 
 class NetworkConfig(BaseModel):
     """Network configuration schema."""
+    model_config = ConfigDict(frozen=True)
+
     name: str = Field(..., description="Network interface name")
     type: NetworkType = Field(NetworkType.NAT, description="Network type")
     bridge: Optional[str] = Field(None, description="Bridge name for bridge networks")
@@ -3,6 +3,7 @@
 import asyncio
 import json
 from typing import Optional
+import orjson
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, Depends
 from sqlalchemy.orm import Session
 
@@ -51,7 +52,7 @@ async def monitor_endpoint(
             try:
                 # Receive message from client
                 message_text = await websocket.receive_text()
-                message = json.loads(message_text)
+                message = orjson.loads(message_text)
                 
                 # Handle the message
                 await websocket_manager.handle_message(connection_id, message)
@@ -131,7 +132,7 @@ async def vm_endpoint(
         while True:
             try:
                 message_text = await websocket.receive_text()
-                message = json.loads(message_text)
+                message = orjson.loads(message_text)
                 
                 # Handle VM-specific messages
                 await websocket_manager.handle_message(connection_id, message)
@@ -201,7 +202,7 @@ async def console_endpoint(
         while True:
             try:
                 message_text = await websocket.receive_text()
-                message = json.loads(message_text)
+                message = orjson.loads(message_text)
                 
                 message_type = message.get("type")
                 
@@ -356,7 +357,7 @@ async def server_endpoint(
         while True:
             try:
                 message_text = await websocket.receive_text()
-                message = json.loads(message_text)
+                message = orjson.loads(message_text)
                 
                 await websocket_manager.handle_message(connection_id, message)
                 
@@ -1,9 +1,13 @@
 """WebSocket connection manager for real-time VM monitoring."""
 
-import json
 import asyncio
-from typing import Dict, List, Set, Optional, Any
-from datetime import datetime
+import itertools
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Set, Optional, Any, Tuple
+from datetime import datetime, timedelta
+from types import MappingProxyType
+import orjson
 from fastapi import WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
 
@@ -12,17 +16,64 @@ from core.logging import get_logger
 
 logger = get_logger("websocket")
 
+# Most messages coalesced into one frame while a connection is busy sending
+MAX_BATCH_SIZE = 128
+
+# Messages a stalled connection may have waiting; older ones are dropped
+MAX_OUTBOX_SIZE = 1024
+
+# Upper bound on disconnected ConnectionInfo objects kept for reuse
+MAX_POOLED_CONNECTIONS = 1024
+
+# Pong reply; the timestamp is second-resolution so one string serves a whole second
+_PONG_TEMPLATE = '{"type":"pong","data":{"timestamp":"%s"}}'
+
+# Client-facing event names and the room that carries them (read-only)
+EVENT_ROOMS = MappingProxyType({
+    "vm_status_changed": "vm_status",
+    "vm_created": "vm_status",
+    "vm_deleted": "vm_status",
+    "vm_metrics_update": "vm_metrics",
+    "server_status_changed": "server_status",
+    "server_registered": "server_status",
+    "server_removed": "server_status",
+    "server_metrics_update": "server_metrics"
+})
+
 
 class ConnectionInfo:
     """Information about a WebSocket connection."""
+    __slots__ = (
+        "websocket", "user", "connected_at_ns",
+        "subscriptions", "vm_subscriptions", "server_subscriptions",
+        "outbox", "dropped", "sending",
+    )
     
     def __init__(self, websocket: WebSocket, user: Optional[dict] = None):
-        self.websocket = websocket
-        self.user = user  # Now a dict from SSO, not ORM User
-        self.connected_at = datetime.utcnow()
         self.subscriptions: Set[str] = set()
         self.vm_subscriptions: Set[int] = set()
         self.server_subscriptions: Set[int] = set()
+        # Ring of serialized messages waiting for the in-flight send to finish
+        self.outbox: deque = deque(maxlen=MAX_OUTBOX_SIZE)
+        self.reset(websocket, user)
+    
+    def reset(self, websocket: WebSocket, user: Optional[dict] = None):
+        """Rebind to a new connection, keeping the allocated containers."""
+        self.websocket = websocket
+        self.user = user  # Now a dict from SSO, not ORM User
+        self.connected_at_ns = time.monotonic_ns()
+        self.subscriptions.clear()
+        self.vm_subscriptions.clear()
+        self.server_subscriptions.clear()
+        self.outbox.clear()
+        self.dropped = 0
+        self.sending = False
+    
+    @property
+    def connected_at(self) -> datetime:
+        """UTC connect time, derived from the monotonic stamp on demand."""
+        elapsed_ns = time.monotonic_ns() - self.connected_at_ns
+        return datetime.utcnow() - timedelta(microseconds=elapsed_ns // 1000)
 
 
 class WebSocketManager:
@@ -32,6 +83,15 @@ class WebSocketManager:
         # Active connections
         self.connections: Dict[str, ConnectionInfo] = {}
         
+        # Recycled ConnectionInfo objects; only touched from the event loop
+        self._free: List[ConnectionInfo] = []
+        
+        # Source of connection ids, unique for the manager's lifetime
+        self._id_counter = itertools.count(1)
+        
+        # (epoch second, serialized pong) shared by all pings in that second
+        self._pong_cache = (None, "")
+        
         # Room-based subscriptions
         self.rooms: Dict[str, Set[str]] = {
             "global": set(),           # Global announcements
@@ -48,33 +108,44 @@ class WebSocketManager:
         # Message queue for offline connections
         self.message_queue: Dict[str, List[Dict]] = {}
         
-    def _generate_connection_id(self, websocket: WebSocket) -> str:
+    def _generate_connection_id(self) -> str:
         """Generate a unique connection ID."""
-        return f"conn_{id(websocket)}_{datetime.utcnow().timestamp()}"
+        return f"conn_{next(self._id_counter):x}"
     
     async def connect(self, websocket: WebSocket, user: Optional[dict] = None) -> str:
         """Accept a new WebSocket connection."""
+        connection_id = self._generate_connection_id()
+        
+        # Serialize the welcome message up front so it follows the
+        # handshake with no work in between
+        welcome = self._encode({
+            "type": "connection_status",
+            "data": {
+                "status": "connected",
+                "connection_id": connection_id,
+                "timestamp": datetime.utcnow().isoformat()
+            }
+        })
+        
         await websocket.accept()
         
-        connection_id = self._generate_connection_id(websocket)
-        connection_info = ConnectionInfo(websocket, user)
+        if self._free:
+            connection_info = self._free.pop()
+            connection_info.reset(websocket, user)
+        else:
+            connection_info = ConnectionInfo(websocket, user)
         
         self.connections[connection_id] = connection_info
         
         # Add to global room by default
         self.rooms["global"].add(connection_id)
-        
-        logger.info(f"WebSocket connected: {connection_id} (user: {user['username'] if user else 'anonymous'})")
+        connection_info.subscriptions.add("global")
         
         # Send welcome message
-        await self.send_to_connection(connection_id, {
-            "type": "connection_status",
-            "data": {
-                "status": "connected",
-                "connection_id": connection_id,
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        })
+        if not await self._send_raw(connection_id, welcome):
+            self.disconnect(connection_id)
+        
+        logger.info(f"WebSocket connected: {connection_id} (user: {user['username'] if user else 'anonymous'})")
         
         # Send queued messages if any
         if connection_id in self.message_queue:
@@ -91,36 +162,131 @@ class WebSocketManager:
         
         connection_info = self.connections[connection_id]
         
-        # Remove from all rooms
-        for room_connections in self.rooms.values():
-            room_connections.discard(connection_id)
-        
-        # Remove from entity-specific rooms
-        for vm_connections in self.vm_rooms.values():
-            vm_connections.discard(connection_id)
+        # Only visit the rooms this connection joined, not every room
+        for room in connection_info.subscriptions:
+            if room in self.rooms:
+                self.rooms[room].discard(connection_id)
         
-        for server_connections in self.server_rooms.values():
-            server_connections.discard(connection_id)
+        # Remove from entity-specific rooms, dropping ones left empty
+        self._leave_entity_rooms(self.vm_rooms, connection_info.vm_subscriptions, connection_id)
+        self._leave_entity_rooms(self.server_rooms, connection_info.server_subscriptions, connection_id)
         
         # Remove connection
         del self.connections[connection_id]
         
+        # Recycle the info unless a send still holds it; that sender would
+        # otherwise drain into whichever connection reuses it next
+        if not connection_info.sending and len(self._free) < MAX_POOLED_CONNECTIONS:
+            connection_info.websocket = None
+            connection_info.user = None
+            self._free.append(connection_info)
+        
         logger.info(f"WebSocket disconnected: {connection_id}")
     
+    @staticmethod
+    def _leave_entity_rooms(entity_rooms: Dict[int, Set[str]], entity_ids: Iterable[int], connection_id: str):
+        """Remove a connection from the given VM/server rooms."""
+        for entity_id in entity_ids:
+            members = entity_rooms.get(entity_id)
+            if members is None:
+                continue
+            members.discard(connection_id)
+            if not members:
+                del entity_rooms[entity_id]
+    
+    @staticmethod
+    def _encode(message: Dict[str, Any]) -> str:
+        """Serialize a message to JSON text."""
+        # OPT_NON_STR_KEYS keeps json.dumps' handling of int-keyed dicts
+        return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS).decode()
+    
     async def send_to_connection(self, connection_id: str, message: Dict[str, Any]) -> bool:
-        """Send a message to a specific connection."""
+        """Send a message to a specific connection.
+
+        True means the message was sent or queued behind an in-flight send
+        (see _send_raw), not that it was delivered: a queued message is
+        still lost if that flush fails or the outbox overflows.
+        """
         if connection_id not in self.connections:
             return False
         
-        connection_info = self.connections[connection_id]
+        try:
+            payload = self._encode(message)
+        except TypeError as e:
+            # orjson.JSONEncodeError is a TypeError; the socket itself is fine
+            logger.error(f"Failed to serialize message for {connection_id}: {e}")
+            return False
         
+        if await self._send_raw(connection_id, payload):
+            return True
+        self.disconnect(connection_id)
+        return False
+    
+    async def _send_raw(self, connection_id: str, payload: str) -> bool:
+        """Send an already-serialized message; the caller handles failures.
+        
+        If a send to this connection is already in flight the payload is
+        queued, and that sender flushes everything queued meanwhile as one
+        JSON array frame (up to MAX_BATCH_SIZE messages). An idle connection
+        gets the message immediately as a plain JSON object. At most
+        MAX_OUTBOX_SIZE messages wait; past that the oldest are dropped.
+        """
+        connection_info = self.connections.get(connection_id)
+        if connection_info is None:
+            return False
+        
+        outbox = connection_info.outbox
+        if len(outbox) == outbox.maxlen:
+            connection_info.dropped += 1
+        outbox.append(payload)
+        if connection_info.sending:
+            return True
+        
+        connection_info.sending = True
         try:
-            await connection_info.websocket.send_text(json.dumps(message))
+            while outbox:
+                if connection_info.dropped:
+                    logger.warning(
+                        f"Connection {connection_id} is falling behind; "
+                        f"dropped {connection_info.dropped} oldest queued messages"
+                    )
+                    connection_info.dropped = 0
+                batch = [outbox.popleft() for _ in range(min(len(outbox), MAX_BATCH_SIZE))]
+                frame = batch[0] if len(batch) == 1 else f"[{','.join(batch)}]"
+                await connection_info.websocket.send_text(frame)
             return True
         except Exception as e:
             logger.error(f"Failed to send message to {connection_id}: {e}")
-            self.disconnect(connection_id)
+            outbox.clear()
             return False
+        finally:
+            connection_info.sending = False
+    
+    @staticmethod
+    def _snapshot(members: Set[str], exclude: Optional[Set[str]]) -> Tuple[str, ...]:
+        """Copy a room's members once, so sends can await while it changes."""
+        if exclude:
+            return tuple(member for member in members if member not in exclude)
+        return tuple(members)
+    
+    async def _fan_out(self, connection_ids: Tuple[str, ...], message: Dict[str, Any]):
+        """Send one message to many connections concurrently.
+        
+        The message is serialized once. Failed connections are dropped after
+        all sends finish, so a dead socket never delays or disturbs the rest.
+        """
+        try:
+            payload = self._encode(message)
+        except TypeError as e:
+            logger.error(f"Failed to serialize broadcast message: {e}")
+            return
+        results = await asyncio.gather(
+            *(self._send_raw(conn_id, payload) for conn_id in connection_ids),
+            return_exceptions=True
+        )
+        for conn_id, sent in zip(connection_ids, results):
+            if sent is not True:
+                self.disconnect(conn_id)
     
     async def broadcast_to_room(self, room: str, message: Dict[str, Any], exclude: Optional[Set[str]] = None):
         """Broadcast a message to all connections in a room."""
@@ -128,61 +294,42 @@ class WebSocketManager:
             logger.warning(f"Room {room} does not exist")
             return
         
-        exclude = exclude or set()
-        connection_ids = self.rooms[room] - exclude
+        connection_ids = self._snapshot(self.rooms[room], exclude)
         
         if not connection_ids:
             return
         
         logger.debug(f"Broadcasting to room {room}: {len(connection_ids)} connections")
         
-        # Send to all connections concurrently
-        tasks = [
-            self.send_to_connection(conn_id, message)
-            for conn_id in connection_ids
-        ]
-        
-        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._fan_out(connection_ids, message)
     
     async def broadcast_to_vm(self, vm_id: int, message: Dict[str, Any], exclude: Optional[Set[str]] = None):
         """Broadcast a message to all connections subscribed to a specific VM."""
         if vm_id not in self.vm_rooms:
             return
         
-        exclude = exclude or set()
-        connection_ids = self.vm_rooms[vm_id] - exclude
+        connection_ids = self._snapshot(self.vm_rooms[vm_id], exclude)
         
         if not connection_ids:
             return
         
         logger.debug(f"Broadcasting to VM {vm_id}: {len(connection_ids)} connections")
         
-        tasks = [
-            self.send_to_connection(conn_id, message)
-            for conn_id in connection_ids
-        ]
-        
-        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._fan_out(connection_ids, message)
     
     async def broadcast_to_server(self, server_id: int, message: Dict[str, Any], exclude: Optional[Set[str]] = None):
         """Broadcast a message to all connections subscribed to a specific server."""
         if server_id not in self.server_rooms:
             return
         
-        exclude = exclude or set()
-        connection_ids = self.server_rooms[server_id] - exclude
+        connection_ids = self._snapshot(self.server_rooms[server_id], exclude)
         
         if not connection_ids:
             return
         
         logger.debug(f"Broadcasting to server {server_id}: {len(connection_ids)} connections")
         
-        tasks = [
-            self.send_to_connection(conn_id, message)
-            for conn_id in connection_ids
-        ]
-        
-        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._fan_out(connection_ids, message)
     
     def subscribe_to_room(self, connection_id: str, room: str):
         """Subscribe a connection to a room."""
@@ -230,9 +377,7 @@ class WebSocketManager:
         if connection_id not in self.connections:
             return False
         
-        if vm_id in self.vm_rooms:
-            self.vm_rooms[vm_id].discard(connection_id)
-        
+        self._leave_entity_rooms(self.vm_rooms, (vm_id,), connection_id)
         self.connections[connection_id].vm_subscriptions.discard(vm_id)
         
         logger.debug(f"Connection {connection_id} unsubscribed from VM {vm_id}")
@@ -257,9 +402,7 @@ class WebSocketManager:
         if connection_id not in self.connections:
             return False
         
-        if server_id in self.server_rooms:
-            self.server_rooms[server_id].discard(connection_id)
-        
+        self._leave_entity_rooms(self.server_rooms, (server_id,), connection_id)
         self.connections[connection_id].server_subscriptions.discard(server_id)
         
         logger.debug(f"Connection {connection_id} unsubscribed from server {server_id}")
@@ -268,16 +411,37 @@ class WebSocketManager:
     async def handle_message(self, connection_id: str, message: Dict[str, Any]):
         """Handle incoming WebSocket message from client."""
         message_type = message.get("type")
-        data = message.get("data", {})
-        
-        if message_type == "subscribe":
-            await self._handle_subscribe(connection_id, data)
-        elif message_type == "unsubscribe":
-            await self._handle_unsubscribe(connection_id, data)
-        elif message_type == "ping":
-            await self._handle_ping(connection_id)
-        else:
+        handler = _MESSAGE_HANDLERS.get(message_type)
+        
+        if handler is None:
             logger.warning(f"Unknown message type: {message_type}")
+            return
+        
+        await handler(self, connection_id, message.get("data", {}))
+    
+    def _bulk_subscribe(self, connection_id: str, rooms: Set[str], vm_ids: List[int], server_ids: List[int]) -> bool:
+        """Subscribe a connection to several rooms, VMs and servers at once."""
+        connection_info = self.connections.get(connection_id)
+        if connection_info is None:
+            return False
+        
+        for room in rooms:
+            self.rooms.setdefault(room, set()).add(connection_id)
+        connection_info.subscriptions.update(rooms)
+        
+        for vm_id in vm_ids:
+            self.vm_rooms.setdefault(vm_id, set()).add(connection_id)
+        connection_info.vm_subscriptions.update(vm_ids)
+        
+        for server_id in server_ids:
+            self.server_rooms.setdefault(server_id, set()).add(connection_id)
+        connection_info.server_subscriptions.update(server_ids)
+        
+        logger.debug(
+            f"Connection {connection_id} subscribed to rooms {sorted(rooms)}, "
+            f"VMs {list(vm_ids)}, servers {list(server_ids)}"
+        )
+        return True
     
     async def _handle_subscribe(self, connection_id: str, data: Dict[str, Any]):
         """Handle subscription requests."""
@@ -285,29 +449,9 @@ class WebSocketManager:
         vm_ids = data.get("vm_ids", [])
         server_ids = data.get("server_ids", [])
         
-        # Subscribe to event types
-        for event in events:
-            room_map = {
-                "vm_status_changed": "vm_status",
-                "vm_created": "vm_status", 
-                "vm_deleted": "vm_status",
-                "vm_metrics_update": "vm_metrics",
-                "server_status_changed": "server_status",
-                "server_registered": "server_status",
-                "server_removed": "server_status", 
-                "server_metrics_update": "server_metrics"
-            }
-            
-            if event in room_map:
-                self.subscribe_to_room(connection_id, room_map[event])
-        
-        # Subscribe to specific VMs
-        for vm_id in vm_ids:
-            self.subscribe_to_vm(connection_id, vm_id)
-        
-        # Subscribe to specific servers  
-        for server_id in server_ids:
-            self.subscribe_to_server(connection_id, server_id)
+        # Subscribe to event rooms, VMs and servers in one pass
+        rooms = {EVENT_ROOMS[event] for event in events if event in EVENT_ROOMS}
+        self._bulk_subscribe(connection_id, rooms, vm_ids, server_ids)
         
         # Send confirmation
         await self.send_to_connection(connection_id, {
@@ -328,19 +472,9 @@ class WebSocketManager:
         
         # Unsubscribe from event types
         for event in events:
-            room_map = {
-                "vm_status_changed": "vm_status",
-                "vm_created": "vm_status",
-                "vm_deleted": "vm_status", 
-                "vm_metrics_update": "vm_metrics",
-                "server_status_changed": "server_status",
-                "server_registered": "server_status",
-                "server_removed": "server_status",
-                "server_metrics_update": "server_metrics"
-            }
-            
-            if event in room_map:
-                self.unsubscribe_from_room(connection_id, room_map[event])
+            room = EVENT_ROOMS.get(event)
+            if room is not None:
+                self.unsubscribe_from_room(connection_id, room)
         
         # Unsubscribe from specific VMs
         for vm_id in vm_ids:
@@ -350,14 +484,15 @@ class WebSocketManager:
         for server_id in server_ids:
             self.unsubscribe_from_server(connection_id, server_id)
     
-    async def _handle_ping(self, connection_id: str):
+    async def _handle_ping(self, connection_id: str, data: Dict[str, Any]):
         """Handle ping/heartbeat messages."""
-        await self.send_to_connection(connection_id, {
-            "type": "pong",
-            "data": {
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        })
+        second = int(time.time())
+        if self._pong_cache[0] != second:
+            timestamp = datetime.utcfromtimestamp(second).isoformat()
+            self._pong_cache = (second, _PONG_TEMPLATE % timestamp)
+        
+        if not await self._send_raw(connection_id, self._pong_cache[1]):
+            self.disconnect(connection_id)
     
     def get_connection_count(self) -> int:
         """Get the total number of active connections."""
@@ -371,5 +506,13 @@ class WebSocketManager:
         }
 
 
+# Inbound message type -> handler, looked up once per message
+_MESSAGE_HANDLERS = {
+    "subscribe": WebSocketManager._handle_subscribe,
+    "unsubscribe": WebSocketManager._handle_unsubscribe,
+    "ping": WebSocketManager._handle_ping,
+}
+
+
 # Global WebSocket manager instance
 websocket_manager = WebSocketManager()
\ No newline at end of file
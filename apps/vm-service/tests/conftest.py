@@ -1,20 +1,37 @@
 """Test configuration and fixtures."""
+import asyncio
+import collections
+import os
+import sys
+import types
+import uuid
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
-# Add src to path
-import sys
-import os
+# Add src to path (once for the whole test package)
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
+# Test-only psutil stand-in for core.resource_validator (see the psutil_stub
+# fixture). The validator only needs cpu_count/virtual_memory/disk_usage, and
+# canned values keep its checks independent of the host (and of /proc scans).
+_GIB = 1024 ** 3
+_svmem = collections.namedtuple("svmem", "total available percent used free")
+_sdiskusage = collections.namedtuple("sdiskusage", "total used free percent")
+_psutil_stub = types.ModuleType("psutil")
+_psutil_stub.cpu_count = lambda logical=True: 16 if logical else 8
+_psutil_stub.virtual_memory = lambda: _svmem(32 * _GIB, 24 * _GIB, 25.0, 8 * _GIB, 24 * _GIB)
+_psutil_stub.disk_usage = lambda path: _sdiskusage(500 * _GIB, 100 * _GIB, 400 * _GIB, 20.0)
+
 from main import app
 from models.base import Base, DatabaseSession
 
-# Create test database
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+# Create test database (in-memory; StaticPool shares the one connection)
+SQLALCHEMY_DATABASE_URL = "sqlite://"
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     connect_args={"check_same_thread": False},
@@ -23,42 +40,154 @@ engine = create_engine(
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
-def override_get_db():
-    """Override database dependency for testing."""
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
+# Optional PostgreSQL server for db_session; each test gets its own clone
+# of a schema-loaded template database instead of a SAVEPOINT on SQLite.
+POSTGRES_TEST_URL = os.environ.get("TEST_POSTGRES_URL")
+TEMPLATE_DB_NAME = "vm_service_test_template"
 
 
-@pytest.fixture
-def client():
-    """Create test client with test database."""
-    # Create test database tables
+def pytest_configure(config):
+    """Register custom markers."""
+    config.addinivalue_line(
+        "markers",
+        "no_auth: test only exercises unauthenticated/invalid-token paths and needs no DB fixtures",
+    )
+    # Provided by pytest-xdist when installed; registered here so plain runs don't warn
+    config.addinivalue_line(
+        "markers",
+        "xdist_group(name): run all tests sharing the group name on one xdist worker",
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip ``no_auth`` tests up front when auth is disabled.
+
+    Skipping at collection time means none of their fixtures get built.
+    """
+    if not os.environ.get("AUTH_DISABLED"):
+        return
+    skip_no_auth = pytest.mark.skip(reason="AUTH_DISABLED is set")
+    for item in items:
+        if "no_auth" in item.keywords:
+            item.add_marker(skip_no_auth)
+
+
+@pytest.fixture(autouse=True)
+def psutil_stub(monkeypatch):
+    """Point the resource validator at the canned psutil values.
+
+    Only ``core.resource_validator`` sees the stub; the real psutil stays in
+    ``sys.modules`` for everything else.
+    """
+    monkeypatch.setattr("core.resource_validator.psutil", _psutil_stub)
+    return _psutil_stub
+
+
+@pytest.fixture(scope="session")
+def event_loop():
+    """Share one event loop across all async tests instead of one per test."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def db_engine():
+    """Create the test schema once per session."""
     Base.metadata.create_all(bind=engine)
-    
-    # Override the database dependency
+    yield engine
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def client(db_session):
+    """Create test client with test database.
+
+    The app shares the test's ``db_session``, so rows seeded through it are
+    visible to the API and everything the API writes is undone with it.
+    """
+    def override_get_db():
+        yield db_session
+
     app.dependency_overrides[DatabaseSession.get_session] = override_get_db
     
     with TestClient(app) as test_client:
         yield test_client
     
-    # Clean up
-    Base.metadata.drop_all(bind=engine)
     app.dependency_overrides.clear()
 
 
+@pytest.fixture(scope="session")
+def postgres_template():
+    """Build the template database once per session.
+
+    Yields ``(admin_engine, url)`` or ``None`` when TEST_POSTGRES_URL is unset.
+    """
+    if not POSTGRES_TEST_URL:
+        yield None
+        return
+
+    url = make_url(POSTGRES_TEST_URL)
+    admin_engine = create_engine(url.set(database="postgres"), isolation_level="AUTOCOMMIT")
+    with admin_engine.connect() as conn:
+        conn.execute(text(f'DROP DATABASE IF EXISTS "{TEMPLATE_DB_NAME}"'))
+        conn.execute(text(f'CREATE DATABASE "{TEMPLATE_DB_NAME}"'))
+
+    template_engine = create_engine(url.set(database=TEMPLATE_DB_NAME))
+    Base.metadata.create_all(bind=template_engine)
+    # CREATE DATABASE ... TEMPLATE fails while the template has open connections
+    template_engine.dispose()
+
+    yield admin_engine, url
+
+    with admin_engine.connect() as conn:
+        conn.execute(text(f'DROP DATABASE IF EXISTS "{TEMPLATE_DB_NAME}"'))
+    admin_engine.dispose()
+
+
 @pytest.fixture
-def db_session():
-    """Create a test database session."""
-    Base.metadata.create_all(bind=engine)
-    connection = engine.connect()
+def db_session(request, postgres_template):
+    """Create a test database session.
+
+    With ``TEST_POSTGRES_URL`` set the session (and the app, through
+    ``client``) is bound to a fresh clone of the template database.
+    On SQLite the session joins an outer transaction via a SAVEPOINT, so
+    ``commit()`` in tests only releases the savepoint and everything is
+    rolled back afterwards.
+    """
+    if postgres_template is not None:
+        admin_engine, url = postgres_template
+        db_name = f"vm_service_test_{uuid.uuid4().hex[:12]}"
+        with admin_engine.connect() as conn:
+            conn.execute(text(f'CREATE DATABASE "{db_name}" TEMPLATE "{TEMPLATE_DB_NAME}"'))
+
+        clone_engine = create_engine(url.set(database=db_name))
+        session = sessionmaker(autocommit=False, autoflush=False, bind=clone_engine)()
+
+        yield session
+
+        session.close()
+        clone_engine.dispose()
+        with admin_engine.connect() as conn:
+            conn.execute(text(f'DROP DATABASE IF EXISTS "{db_name}"'))
+        return
+
+    # Only the SQLite path needs the shared in-memory schema
+    db_engine = request.getfixturevalue("db_engine")
+    connection = db_engine.connect()
+    # pysqlite defers BEGIN until the first DML, which breaks SAVEPOINT-based
+    # isolation. Take over transaction control on this connection only and
+    # hand the driver back its default afterwards.
+    dbapi_connection = connection.connection.dbapi_connection
+    isolation_level = dbapi_connection.isolation_level
+    dbapi_connection.isolation_level = None
     transaction = connection.begin()
-    session = TestingSessionLocal(bind=connection)
+    connection.exec_driver_sql("BEGIN")
+    session = TestingSessionLocal(bind=connection, join_transaction_mode="create_savepoint")
     
     yield session
     
     session.close()
     transaction.rollback()
+    dbapi_connection.isolation_level = isolation_level
     connection.close()
\ No newline at end of file
@@ -0,0 +1,93 @@
+"""Test SSO access-level permissions and the role/permission decorators."""
+
+import httpx
+import pytest
+from unittest.mock import patch
+
+from core.auth import (
+    ACCESS_LEVEL_PERMISSIONS, NO_PERMISSIONS, AuthenticationError, AuthorizationError,
+    fetch_user_from_sso, require_permissions, require_roles
+)
+
+
+@require_permissions(["read", "write"])
+async def _write_endpoint(current_user: dict = None):
+    return "ok"
+
+
+@require_roles(["admin"])
+async def _admin_endpoint(current_user: dict = None):
+    return "ok"
+
+
+def _sso_returning(user: dict):
+    """Patch the SSO client so /me answers with the given user."""
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json={"user": user}))
+    client_class = httpx.AsyncClient
+    return patch("core.auth.httpx.AsyncClient", lambda: client_class(transport=transport))
+
+
+@pytest.mark.parametrize("access_level,permissions", [
+    ("admin", {"read", "write", "delete", "admin"}),
+    ("premium", {"read", "write"}),
+    ("standard", {"read"}),
+    ("guest", set()),
+])
+async def test_access_level_permissions(access_level, permissions):
+    """Test SSO users get the permissions of their access level, none if unknown."""
+    with _sso_returning({"id": 1, "username": "testuser", "accessLevel": access_level}):
+        user = await fetch_user_from_sso("token")
+
+    assert user["permissions"] == permissions
+    assert user["permissions"] is ACCESS_LEVEL_PERMISSIONS.get(access_level, NO_PERMISSIONS)
+
+
+async def test_require_permissions_allows_granted_user():
+    """Test a user holding every required permission reaches the endpoint."""
+    user = {"username": "testuser", "permissions": ACCESS_LEVEL_PERMISSIONS["premium"]}
+    assert await _write_endpoint(current_user=user) == "ok"
+
+
+@pytest.mark.parametrize("user,missing", [
+    ({"username": "testuser", "permissions": ACCESS_LEVEL_PERMISSIONS["standard"]}, {"write"}),
+    ({"username": "testuser"}, {"read", "write"}),
+], ids=["missing-write", "no-permissions"])
+async def test_require_permissions_rejects_missing(user, missing):
+    """Test missing permissions are rejected with 403."""
+    with pytest.raises(AuthorizationError) as exc_info:
+        await _write_endpoint(current_user=user)
+
+    assert exc_info.value.status_code == 403
+    prefix, _, names = exc_info.value.detail.partition(": ")
+    assert prefix == "Missing required permissions"
+    assert set(names.split(", ")) == missing
+
+
+async def test_require_permissions_requires_user():
+    """Test an anonymous call is rejected with 401."""
+    with pytest.raises(AuthenticationError) as exc_info:
+        await _write_endpoint()
+
+    assert exc_info.value.status_code == 401
+
+
+@pytest.mark.parametrize("user,allowed", [
+    ({"username": "testuser", "roles": ["user", "admin"]}, True),
+    ({"username": "testuser", "roles": ["user"]}, False),
+    ({"username": "testuser", "accessLevel": "admin"}, True),
+    ({"username": "testuser", "accessLevel": "standard"}, False),
+    # An explicit roles list wins over the accessLevel fallback
+    ({"username": "testuser", "roles": ["user"], "accessLevel": "admin"}, False),
+    ({"username": "testuser"}, False),
+], ids=["roles", "roles-missing", "access-level", "access-level-missing", "roles-over-access-level", "none"])
+async def test_require_roles(user, allowed):
+    """Test roles come from the roles list, falling back to accessLevel."""
+    if allowed:
+        assert await _admin_endpoint(current_user=user) == "ok"
+        return
+
+    with pytest.raises(AuthorizationError) as exc_info:
+        await _admin_endpoint(current_user=user)
+
+    assert exc_info.value.status_code == 403
+    assert exc_info.value.detail == "Missing required roles: admin"
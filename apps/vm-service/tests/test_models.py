@@ -5,11 +5,6 @@ from sqlalchemy.orm import Session
 from datetime import datetime
 import uuid
 
-# Add src to path
-import sys
-import os
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
-
 from models import User, Role, Server, VirtualMachine, VMTemplate, AuditLog, ServerMetrics, VMSnapshot
 from models.server import ServerStatus
 from models.virtual_machine import VMStatus, OSType
@@ -66,6 +66,18 @@ def test_refresh_token_creation_and_verification():
     assert token_data.user_id == 123
 
 
+def test_hs256_encoding_matches_jose():
+    """Test the specialised HS256 encoder produces the same token as python-jose."""
+    from jose import jwt
+    from core.config import settings
+    from core.security import _encode_jwt
+
+    claims = {"sub": "testuser", "user_id": 123, "exp": datetime(2030, 1, 1), "type": "access"}
+    expected = jwt.encode(dict(claims), settings.secret_key, algorithm="HS256")
+
+    assert _encode_jwt(dict(claims)) == expected
+
+
 def test_token_expiration():
     """Test token expiration."""
     data = {"sub": "testuser", "user_id": 123}
@@ -4,27 +4,29 @@ import pytest
 from datetime import datetime, timezone
 from fastapi import status
 
-# Add src to path
-import sys
-import os
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
-
-from models.user import User
+from core.auth import get_current_active_user
 from models.server import Server, ServerStatus
 
 
+@pytest.fixture(autouse=True)
+def no_network(monkeypatch):
+    """Keep discovery/verify handlers from opening real sockets.
+
+    Only the TCP probe is stubbed, so subnet validation in ``scan_subnet``
+    still runs (see ``test_discover_servers_rejects_invalid_subnet``).
+    """
+    monkeypatch.setattr("api.server.ping_server", lambda *args, **kwargs: True)
+
+
+# Headers for tests that only assert on auth/validation failures and never
+# log in, so they don't pay for the test_user/test_server DB fixtures.
+NO_AUTH_HEADERS = {"Authorization": "Bearer test-token"}
+
+
 @pytest.fixture
-def test_user(db_session):
-    """Create a test user."""
-    user = User(
-        username="testuser",
-        email="test@example.com", 
-        password_hash="hashed_password"
-    )
-    db_session.add(user)
-    db_session.commit()
-    db_session.refresh(user)
-    return user
+def test_user():
+    """Create a test user (an SSO user dict; users are not stored locally)."""
+    return {"id": 1, "username": "testuser", "email": "test@example.com"}
 
 
 @pytest.fixture
@@ -40,7 +42,7 @@ def test_server(db_session, test_user):
         memory_gb=16.0,
         disk_gb=500.0,
         agent_version="1.0.0",
-        user_id=test_user.id
+        user_id=test_user["id"]
     )
     db_session.add(server)
     db_session.commit()
@@ -48,12 +50,31 @@ def test_server(db_session, test_user):
     return server
 
 
+def seed_servers(session, n, user_id, status=ServerStatus.ONLINE):
+    """Bulk insert ``n`` simple servers for listing/pagination tests.
+
+    Uses ``bulk_insert_mappings`` to bypass the unit of work; rows are not
+    refreshed, so tests should re-query for ids.
+    """
+    session.bulk_insert_mappings(Server, [
+        {
+            "hostname": f"seed-server-{i}",
+            "ip_address": f"10.0.{i // 256}.{i % 256}",
+            "port": 22,
+            "status": status,
+            "user_id": user_id,
+        }
+        for i in range(n)
+    ])
+    session.commit()
+
+
 @pytest.fixture
 def auth_headers(client, test_user):
     """Get authentication headers for test user."""
     # Login to get token
     response = client.post("/api/auth/login", json={
-        "username": test_user.username,
+        "username": test_user["username"],
         "password": "password"  # This would work with mock auth
     })
     
@@ -92,7 +113,8 @@ def test_register_server(client, auth_headers):
         assert data["status"] == "online"
 
 
-def test_register_server_invalid_token(client, auth_headers):
+@pytest.mark.no_auth
+def test_register_server_invalid_token(client):
     """Test server registration with invalid token."""
     server_data = {
         "hostname": "new-server",
@@ -107,79 +129,110 @@ def test_register_server_invalid_token(client, auth_headers):
         "auth_token": "short"  # Invalid token
     }
     
-    response = client.post("/api/servers/register", json=server_data, headers=auth_headers)
+    response = client.post("/api/servers/register", json=server_data, headers=NO_AUTH_HEADERS)
     
     # Should fail due to invalid token or auth issues
     assert response.status_code in [status.HTTP_401_UNAUTHORIZED, status.HTTP_400_BAD_REQUEST]
 
 
-def test_list_servers(client, auth_headers, test_server):
-    """Test listing servers."""
-    response = client.get("/api/servers", headers=auth_headers)
-    
-    # Note: Will fail without proper auth, but validates endpoint structure
-    assert response.status_code in [status.HTTP_200_OK, status.HTTP_401_UNAUTHORIZED]
-    
-    if response.status_code == status.HTTP_200_OK:
-        data = response.json()
-        assert "servers" in data
-        assert "total" in data
-        assert "page" in data
-        assert "per_page" in data
-
-
-def test_list_servers_with_filters(client, auth_headers, test_server):
-    """Test listing servers with filters."""
-    response = client.get("/api/servers?status=online&hostname=test", headers=auth_headers)
-    
-    assert response.status_code in [status.HTTP_200_OK, status.HTTP_401_UNAUTHORIZED]
+OK = status.HTTP_200_OK
+UNAUTHORIZED = status.HTTP_401_UNAUTHORIZED
+NOT_FOUND = status.HTTP_404_NOT_FOUND
+
+SERVER_ENDPOINT_CASES = [
+    pytest.param(
+        "get", "/api/servers", None, {OK, UNAUTHORIZED},
+        ("servers", "total", "page", "per_page"), {},
+        id="list",
+    ),
+    pytest.param(
+        "get", "/api/servers/{server_id}", None, {OK, UNAUTHORIZED, NOT_FOUND},
+        ("id",), {"hostname": "test-server"},
+        id="get",
+    ),
+    pytest.param(
+        "get", "/api/servers/99999", None, {NOT_FOUND, UNAUTHORIZED},
+        (), {},
+        id="get-nonexistent",
+    ),
+    pytest.param(
+        "put", "/api/servers/{server_id}", {"hostname": "updated-server", "cpu_cores": 8},
+        {OK, UNAUTHORIZED, NOT_FOUND},
+        ("id",), {"hostname": "updated-server", "cpu_cores": 8},
+        id="update",
+    ),
+    pytest.param(
+        "delete", "/api/servers/{server_id}", None, {OK, UNAUTHORIZED, NOT_FOUND},
+        ("message",), {},
+        id="delete",
+    ),
+    pytest.param(
+        "post", "/api/servers/{server_id}/verify", None, {OK, UNAUTHORIZED, NOT_FOUND},
+        ("id", "operation", "status", "timestamp"), {},
+        id="verify",
+    ),
+    pytest.param(
+        "get", "/api/servers/{server_id}/status", None, {OK, UNAUTHORIZED, NOT_FOUND},
+        ("id", "status", "is_reachable"), {},
+        id="status",
+    ),
+    pytest.param(
+        "get", "/api/servers/{server_id}/metrics", None, {OK, UNAUTHORIZED, NOT_FOUND},
+        ("id", "timestamp", "memory_total_gb", "disk_total_gb"), {},
+        id="metrics",
+    ),
+    pytest.param(
+        "post", "/api/servers/{server_id}/health-check", None, {OK, UNAUTHORIZED, NOT_FOUND},
+        ("id", "checks", "overall_health", "timestamp"), {},
+        id="health-check",
+    ),
+]
+
+
+@pytest.mark.parametrize("method,url,body,allowed,required_keys,expected", SERVER_ENDPOINT_CASES)
+def test_server_endpoints(client, auth_headers, test_server, method, url, body, allowed, required_keys, expected):
+    """Test server endpoints respond with an allowed status and expected payload."""
+    kwargs = {"headers": auth_headers}
+    if body is not None:
+        kwargs["json"] = body
+
+    response = getattr(client, method)(url.format(server_id=test_server.id), **kwargs)
 
+    # Note: Will fail without proper auth, but validates endpoint structure
+    assert response.status_code in allowed
 
-def test_get_server(client, auth_headers, test_server):
-    """Test getting specific server."""
-    response = client.get(f"/api/servers/{test_server.id}", headers=auth_headers)
-    
-    assert response.status_code in [status.HTTP_200_OK, status.HTTP_401_UNAUTHORIZED, status.HTTP_404_NOT_FOUND]
-    
-    if response.status_code == status.HTTP_200_OK:
+    if response.status_code == OK:
         data = response.json()
-        assert data["id"] == test_server.id
-        assert data["hostname"] == test_server.hostname
-
-
-def test_get_nonexistent_server(client, auth_headers):
-    """Test getting non-existent server."""
-    response = client.get("/api/servers/99999", headers=auth_headers)
-    
-    assert response.status_code in [status.HTTP_404_NOT_FOUND, status.HTTP_401_UNAUTHORIZED]
+        for key in required_keys:
+            assert key in data
+        if "id" in required_keys:
+            assert data["id"] == test_server.id
+        for key, value in expected.items():
+            assert data[key] == value
 
 
-def test_update_server(client, auth_headers, test_server):
-    """Test updating server."""
-    update_data = {
-        "hostname": "updated-server",
-        "cpu_cores": 8
-    }
-    
-    response = client.put(f"/api/servers/{test_server.id}", json=update_data, headers=auth_headers)
-    
-    assert response.status_code in [status.HTTP_200_OK, status.HTTP_401_UNAUTHORIZED, status.HTTP_404_NOT_FOUND]
-    
-    if response.status_code == status.HTTP_200_OK:
-        data = response.json()
-        assert data["hostname"] == update_data["hostname"]
-        assert data["cpu_cores"] == update_data["cpu_cores"]
-
+def test_list_servers_with_filters(client, auth_headers, db_session, test_user, test_server):
+    """Test listing servers with filters."""
+    seed_servers(db_session, 25, test_user["id"])
+    # Matches the hostname filter but not the status one
+    db_session.add(Server(
+        hostname="seed-server-offline",
+        ip_address="10.1.0.1",
+        port=22,
+        status=ServerStatus.OFFLINE,
+        user_id=test_user["id"]
+    ))
+    db_session.commit()
+    assert db_session.query(Server).filter(Server.hostname.like("seed-server-%")).count() == 26
 
-def test_delete_server(client, auth_headers, test_server):
-    """Test deleting server."""
-    response = client.delete(f"/api/servers/{test_server.id}", headers=auth_headers)
+    response = client.get("/api/servers?status=online&hostname=seed&per_page=100", headers=auth_headers)
     
-    assert response.status_code in [status.HTTP_200_OK, status.HTTP_401_UNAUTHORIZED, status.HTTP_404_NOT_FOUND]
+    assert response.status_code in [status.HTTP_200_OK, status.HTTP_401_UNAUTHORIZED]
     
     if response.status_code == status.HTTP_200_OK:
         data = response.json()
-        assert "message" in data
+        assert data["total"] == 25
+        assert {server["hostname"] for server in data["servers"]} == {f"seed-server-{i}" for i in range(25)}
 
 
 def test_discover_servers(client, auth_headers):
@@ -201,7 +254,8 @@ def test_discover_servers(client, auth_headers):
         assert "total_found" in data
 
 
-def test_discover_servers_invalid_subnet(client, auth_headers):
+@pytest.mark.no_auth
+def test_discover_servers_invalid_subnet(client):
     """Test server discovery with invalid subnet."""
     discover_data = {
         "subnet": "invalid_subnet",
@@ -209,64 +263,24 @@ def test_discover_servers_invalid_subnet(client, auth_headers):
         "timeout": 5
     }
     
-    response = client.post("/api/servers/discover", json=discover_data, headers=auth_headers)
+    response = client.post("/api/servers/discover", json=discover_data, headers=NO_AUTH_HEADERS)
     
     assert response.status_code in [status.HTTP_400_BAD_REQUEST, status.HTTP_401_UNAUTHORIZED]
 
 
-def test_verify_server(client, auth_headers, test_server):
-    """Test server connectivity verification."""
-    response = client.post(f"/api/servers/{test_server.id}/verify", headers=auth_headers)
-    
-    assert response.status_code in [status.HTTP_200_OK, status.HTTP_401_UNAUTHORIZED, status.HTTP_404_NOT_FOUND]
-    
-    if response.status_code == status.HTTP_200_OK:
-        data = response.json()
-        assert data["id"] == test_server.id
-        assert "operation" in data
-        assert "status" in data
-        assert "timestamp" in data
-
-
-def test_get_server_status(client, auth_headers, test_server):
-    """Test getting server status."""
-    response = client.get(f"/api/servers/{test_server.id}/status", headers=auth_headers)
-    
-    assert response.status_code in [status.HTTP_200_OK, status.HTTP_401_UNAUTHORIZED, status.HTTP_404_NOT_FOUND]
-    
-    if response.status_code == status.HTTP_200_OK:
-        data = response.json()
-        assert data["id"] == test_server.id
-        assert "status" in data
-        assert "is_reachable" in data
-
-
-def test_get_server_metrics(client, auth_headers, test_server):
-    """Test getting server metrics."""
-    response = client.get(f"/api/servers/{test_server.id}/metrics", headers=auth_headers)
-    
-    assert response.status_code in [status.HTTP_200_OK, status.HTTP_401_UNAUTHORIZED, status.HTTP_404_NOT_FOUND]
-    
-    if response.status_code == status.HTTP_200_OK:
-        data = response.json()
-        assert data["id"] == test_server.id
-        assert "timestamp" in data
-        assert "memory_total_gb" in data
-        assert "disk_total_gb" in data
-
-
-def test_health_check(client, auth_headers, test_server):
-    """Test manual health check."""
-    response = client.post(f"/api/servers/{test_server.id}/health-check", headers=auth_headers)
+def test_discover_servers_rejects_invalid_subnet(client, test_user):
+    """Test an authenticated discovery with an invalid subnet gets 400, not 500."""
+    client.app.dependency_overrides[get_current_active_user] = lambda: test_user
+    discover_data = {
+        "subnet": "invalid_subnet",
+        "port": 22,
+        "timeout": 5
+    }
     
-    assert response.status_code in [status.HTTP_200_OK, status.HTTP_401_UNAUTHORIZED, status.HTTP_404_NOT_FOUND]
+    response = client.post("/api/servers/discover", json=discover_data)
     
-    if response.status_code == status.HTTP_200_OK:
-        data = response.json()
-        assert data["id"] == test_server.id
-        assert "checks" in data
-        assert "overall_health" in data
-        assert "timestamp" in data
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["error"]["message"].startswith("Invalid subnet format")
 
 
 def test_schema_validation():
@@ -1,9 +1,6 @@
 """Test VM API endpoints."""
 
 import pytest
-from unittest.mock import Mock, AsyncMock, patch
-from fastapi.testclient import TestClient
-from sqlalchemy.orm import Session
 
 # This test file demonstrates the expected API structure
 # Actual testing would require FastAPI dependencies to be installed
@@ -1,33 +1,52 @@
 """Integration tests for VM resource management API endpoints."""
 
+import importlib.util
 import pytest
 import json
-from fastapi.testclient import TestClient
+import orjson
+from functools import lru_cache
+from datetime import datetime
 from unittest.mock import Mock, patch
 
+try:
+    from schemas.resources import ResourceLimits, VMResources, CPUConfig, MemoryConfig, DiskConfig, NetworkConfig
+    from schemas.template import PREDEFINED_TEMPLATES, TemplateCreate, TemplateType
+    from models.virtual_machine import OSType
+except ImportError:
+    pytest.skip("vm-service schemas not available", allow_module_level=True)
+
+# Resolved once at import instead of per assertion
+_SMALL = PREDEFINED_TEMPLATES[TemplateType.SMALL]
+_MEDIUM = PREDEFINED_TEMPLATES[TemplateType.MEDIUM]
+_LARGE = PREDEFINED_TEMPLATES[TemplateType.LARGE]
+
 # Mock dependencies to avoid database/libvirt requirements during testing
 
+@pytest.fixture(scope="module")
+def mock_dependencies(client):
+    """Mock all external dependencies.
 
-@pytest.fixture
-def mock_dependencies():
-    """Mock all external dependencies."""
-    with patch('models.base.DatabaseSession.get_session') as mock_db, \
-         patch('core.auth.get_current_active_user') as mock_user, \
-         patch('core.auth.require_permissions') as mock_perms, \
-         patch('core.resource_validator.ResourceValidator') as mock_validator:
+    Authentication and the database are swapped out through the app's
+    dependency overrides, so requests reach the endpoint handlers.
+    """
+    if not client:
+        pytest.skip("Test client not available")
+    
+    from core.auth import get_current_active_user
+    from api import template as template_api, vm as vm_api
+    
+    with patch('api.vm.ResourceValidator') as mock_vm_validator, \
+         patch('api.template.ResourceValidator') as mock_template_validator:
         
         # Mock database session
-        mock_db.return_value = Mock()
-        
-        # Mock current user
-        mock_user.return_value = Mock(id=1, username="testuser")
+        mock_db_session = Mock()
         
-        # Mock permissions (just pass through)
-        mock_perms.return_value = lambda func: func
+        # Mock current user, allowed through require_permissions
+        current_user = {"id": 1, "username": "testuser", "permissions": ["read", "write"]}
         
-        # Mock validator
+        # Mock validator, built once for the module
         mock_validator_instance = Mock()
-        mock_validator_instance.get_system_limits.return_value = Mock(
+        mock_validator_instance.get_system_limits.return_value = ResourceLimits(
             max_cpu_cores=8,
             max_memory_mb=16384,
             max_disk_gb=1000.0,
@@ -42,209 +61,248 @@ def mock_dependencies():
             errors=[],
             warnings=[]
         )
-        mock_validator.return_value = mock_validator_instance
+        mock_vm_validator.return_value = mock_validator_instance
+        mock_template_validator.return_value = mock_validator_instance
+        
+        # Query results shared by the template list and VM resource update requests
+        mock_db_session.query.return_value.filter.return_value.count.return_value = 0
+        mock_db_session.query.return_value.filter.return_value.offset.return_value.limit.return_value.all.return_value = []
         
-        yield {
-            'db': mock_db,
-            'user': mock_user,
-            'perms': mock_perms,
-            'validator': mock_validator_instance
+        mock_vm_instance = Mock(
+            id=1,
+            cpu_cores=1,
+            cpu_sockets=1,
+            cpu_threads=1,
+            cpu_model=None,
+            cpu_shares=None,
+            cpu_limit=None,
+            memory_mb=1024,
+            memory_hugepages=False,
+            memory_balloon=True,
+            memory_shares=None,
+            status="stopped",
+            disks=[],
+            networks=[]
+        )
+        mock_vm_instance.name = "test-vm"
+        mock_db_session.query.return_value.filter.return_value.first.return_value = mock_vm_instance
+        
+        overrides = {
+            get_current_active_user: lambda: current_user,
+            vm_api.get_db: lambda: mock_db_session,
+            template_api.get_db: lambda: mock_db_session,
         }
+        client.app.dependency_overrides.update(overrides)
+        try:
+            yield {
+                'db': mock_db_session,
+                'user': current_user,
+                'validator': mock_validator_instance
+            }
+        finally:
+            for dependency in overrides:
+                client.app.dependency_overrides.pop(dependency, None)
+
+
+@lru_cache(maxsize=1)
+def _get_app():
+    """Import the FastAPI app once per worker process.
+
+    Route registration and schema building then happen once, even when
+    pytest re-imports this module (``--lf``/``--ff`` reruns).
+    """
+    from src.app import app
+    return app
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def client():
-    """Create test client."""
+    """Create test client.
+    
+    One blocking portal (event loop thread) is kept open for the whole
+    session instead of TestClient starting a new one per request. Lifespan
+    is deliberately not run: startup needs a reachable database.
+    """
+    # Cheap spec lookup first so minimal environments skip the heavy import chain
+    if importlib.util.find_spec("fastapi") is None:
+        yield None
+        return
+    
     # Import after mocking to avoid dependency issues
     try:
-        from src.app import app
-        return TestClient(app)
+        import anyio
+        from fastapi.testclient import TestClient
+        app = _get_app()
     except ImportError:
         # Fallback for when dependencies aren't available
-        return None
+        yield None
+        return
+    
+    test_client = TestClient(app)
+    with anyio.from_thread.start_blocking_portal(**test_client.async_backend) as portal:
+        test_client.portal = portal
+        yield test_client
+        test_client.portal = None
+
+
+TEMPLATE_CREATE_DATA = {
+    "name": "Test Template",
+    "description": "A test template",
+    "type": "small",
+    "os_type": "linux",
+    "resources": {
+        "cpu": {
+            "cores": 1,
+            "sockets": 1,
+            "threads": 1
+        },
+        "memory": {
+            "size_mb": 1024,
+            "hugepages": False,
+            "balloon": True
+        },
+        "disks": [
+            {
+                "name": "main",
+                "size_gb": 20.0,
+                "format": "qcow2",
+                "bootable": True
+            }
+        ],
+        "network": [
+            {
+                "name": "default",
+                "type": "nat"
+            }
+        ]
+    },
+    "tags": ["test"],
+    "public": False
+}
+
+VM_RESOURCE_UPDATE_DATA = {
+    "cpu": {
+        "cores": 2,
+        "sockets": 1,
+        "threads": 1
+    },
+    "memory": {
+        "size_mb": 2048,
+        "hugepages": False,
+        "balloon": True
+    },
+    "validate_only": True
+}
 
 
 class TestResourceManagementAPI:
     """Test resource management API endpoints."""
     
-    def test_get_resource_limits(self, client, mock_dependencies):
-        """Test GET /api/vm/resource-limits endpoint."""
-        if not client:
-            pytest.skip("Test client not available")
+    @pytest.mark.parametrize("method,path,body,found,status_code,expected", [
+        pytest.param(
+            "get", "/api/vm/resource-limits", None, True, 200,
+            {"max_cpu_cores": 8, "available_memory_mb": 12288},
+            id="resource-limits",
+        ),
+        pytest.param(
+            "get", "/api/templates", None, True, 200,
+            {"templates": [], "total": 0, "total_pages": 0},
+            id="template-list",
+        ),
+        pytest.param(
+            "post", "/api/templates", TEMPLATE_CREATE_DATA, False, 201,
+            {"id": 1, "name": "Test Template", "created_by": 1, "tags": ["test"]},
+            id="template-create",
+        ),
+        pytest.param(
+            "post", "/api/templates", TEMPLATE_CREATE_DATA, True, 400,
+            {"message": "Template with name 'Test Template' already exists"},
+            id="template-create-duplicate",
+        ),
+        pytest.param(
+            "put", "/api/vm/1/resources", VM_RESOURCE_UPDATE_DATA, True, 200,
+            {"id": 1, "operation": "validate-resources", "status": "success"},
+            id="vm-resource-update",
+        ),
+        pytest.param(
+            "put", "/api/vm/1/resources", VM_RESOURCE_UPDATE_DATA, False, 404,
+            {"message": "VM with ID 1 not found"},
+            id="vm-resource-update-missing",
+        ),
+    ])
+    def test_endpoint(self, client, mock_dependencies, method, path, body, found, status_code, expected):
+        """Test resource management endpoints against one shared client."""
+        kwargs = {}
+        if body is not None:
+            kwargs["content"] = orjson.dumps(body)
+            kwargs["headers"] = {"content-type": "application/json"}
         
-        response = client.get("/api/vm/resource-limits")
+        # Lookups by id or name hit the shared VM row unless the case wants a miss
+        lookup = mock_dependencies['db'].query.return_value.filter.return_value
+        found_row = lookup.first.return_value
         
-        # Without proper mocking, this will likely fail
-        # but shows the intended test structure
-        # assert response.status_code == 200
-        # data = response.json()
-        # assert "max_cpu_cores" in data
-        # assert "available_memory_mb" in data
-    
-    def test_template_list(self, client, mock_dependencies):
-        """Test GET /api/templates endpoint."""
-        if not client:
-            pytest.skip("Test client not available")
-        
-        with patch('models.vm_template.VMTemplate') as mock_template:
-            mock_db_session = mock_dependencies['db'].return_value
-            mock_db_session.query.return_value.filter.return_value.count.return_value = 0
-            mock_db_session.query.return_value.filter.return_value.offset.return_value.limit.return_value.all.return_value = []
-            
-            response = client.get("/api/templates")
-            
-            # Test structure shows intended functionality
-            # Actual execution would require full mocking setup
-    
-    def test_template_creation(self, client, mock_dependencies):
-        """Test POST /api/templates endpoint."""
-        if not client:
-            pytest.skip("Test client not available")
+        def refresh(instance):
+            # Column defaults a real refresh() would load after the INSERT
+            instance.id = 1
+            instance.created_at = datetime(2024, 1, 1)
+            instance.version = 1
         
-        template_data = {
-            "name": "Test Template",
-            "description": "A test template",
-            "type": "small",
-            "os_type": "linux",
-            "resources": {
-                "cpu": {
-                    "cores": 1,
-                    "sockets": 1,
-                    "threads": 1
-                },
-                "memory": {
-                    "size_mb": 1024,
-                    "hugepages": False,
-                    "balloon": True
-                },
-                "disks": [
-                    {
-                        "name": "main",
-                        "size_gb": 20.0,
-                        "format": "qcow2",
-                        "bootable": True
-                    }
-                ],
-                "network": [
-                    {
-                        "name": "default",
-                        "type": "nat"
-                    }
-                ]
-            },
-            "tags": ["test"],
-            "public": False
-        }
+        with patch.object(lookup, "first", return_value=found_row if found else None), \
+             patch.object(mock_dependencies['db'], "refresh", side_effect=refresh):
+            response = getattr(client, method)(path, **kwargs)
         
-        with patch('models.vm_template.VMTemplate') as mock_template:
-            mock_db_session = mock_dependencies['db'].return_value
-            
-            response = client.post("/api/templates", json=template_data)
-            
-            # Test structure shows intended functionality
-    
-    def test_vm_resource_update(self, client, mock_dependencies):
-        """Test PUT /api/vm/{vm_id}/resources endpoint."""
-        if not client:
-            pytest.skip("Test client not available")
-        
-        update_data = {
-            "cpu": {
-                "cores": 2,
-                "sockets": 1,
-                "threads": 1
-            },
-            "memory": {
-                "size_mb": 2048,
-                "hugepages": False,
-                "balloon": True
-            },
-            "validate_only": True
-        }
-        
-        with patch('models.virtual_machine.VirtualMachine') as mock_vm:
-            mock_db_session = mock_dependencies['db'].return_value
-            mock_vm_instance = Mock()
-            mock_vm_instance.id = 1
-            mock_vm_instance.name = "test-vm"
-            mock_vm_instance.cpu_cores = 1
-            mock_vm_instance.memory_mb = 1024
-            mock_vm_instance.status = "stopped"
-            mock_vm_instance.disks = []
-            mock_vm_instance.networks = []
-            
-            mock_db_session.query.return_value.filter.return_value.first.return_value = mock_vm_instance
-            
-            response = client.put("/api/vm/1/resources", json=update_data)
-            
-            # Test structure shows intended functionality
+        assert response.status_code == status_code, response.text
+        data = response.json()
+        if response.is_error:
+            data = data["error"]
+        assert {key: data.get(key) for key in expected} == expected
 
 
 class TestResourceValidation:
     """Test resource validation logic."""
     
-    def test_cpu_validation_logic(self):
-        """Test CPU validation logic."""
-        from schemas.resources import CPUConfig
-        
-        # Valid CPU configuration
-        cpu_valid = CPUConfig(cores=2, sockets=1, threads=1)
-        assert cpu_valid.cores == 2
-        assert cpu_valid.sockets == 1
-        
-        # Test with advanced options
-        cpu_advanced = CPUConfig(
-            cores=4,
-            sockets=2,
-            threads=1,
-            model="host-passthrough",
-            pinning=[0, 1, 2, 3],
-            shares=1024,
-            limit=80
-        )
-        assert len(cpu_advanced.pinning) == 4
-        assert cpu_advanced.shares == 1024
-    
-    def test_memory_validation_logic(self):
-        """Test memory validation logic."""
-        from schemas.resources import MemoryConfig
-        
-        memory = MemoryConfig(
-            size_mb=4096,
-            hugepages=True,
-            balloon=False,
-            shares=512
-        )
-        assert memory.size_mb == 4096
-        assert memory.hugepages is True
-    
-    def test_disk_validation_logic(self):
-        """Test disk validation logic."""
-        from schemas.resources import DiskConfig
-        
-        disk = DiskConfig(
-            name="main",
-            size_gb=50.0,
-            format="qcow2",
-            pool="default",
-            bootable=True
-        )
-        assert disk.name == "main"
-        assert disk.bootable is True
-    
-    def test_network_validation_logic(self):
-        """Test network validation logic."""
-        from schemas.resources import NetworkConfig
-        
-        network = NetworkConfig(
-            name="eth0",
-            type="bridge",
-            bridge="br0",
-            vlan_id=100,
-            ip_address="192.168.1.100"
-        )
-        assert network.name == "eth0"
-        assert network.vlan_id == 100
+    @pytest.mark.parametrize("cls,kwargs,expected", [
+        pytest.param(
+            CPUConfig, {"cores": 2, "sockets": 1, "threads": 1},
+            {"cores": 2, "sockets": 1},
+            id="cpu",
+        ),
+        pytest.param(
+            CPUConfig,
+            {
+                "cores": 4,
+                "sockets": 2,
+                "threads": 1,
+                "model": "host-passthrough",
+                "pinning": [0, 1, 2, 3],
+                "shares": 1024,
+                "limit": 80
+            },
+            {"pinning": [0, 1, 2, 3], "shares": 1024},
+            id="cpu-advanced",
+        ),
+        pytest.param(
+            MemoryConfig, {"size_mb": 4096, "hugepages": True, "balloon": False, "shares": 512},
+            {"size_mb": 4096, "hugepages": True},
+            id="memory",
+        ),
+        pytest.param(
+            DiskConfig, {"name": "main", "size_gb": 50.0, "format": "qcow2", "pool": "default", "bootable": True},
+            {"name": "main", "bootable": True},
+            id="disk",
+        ),
+        pytest.param(
+            NetworkConfig,
+            {"name": "eth0", "type": "bridge", "bridge": "br0", "vlan_id": 100, "ip_address": "192.168.1.100"},
+            {"name": "eth0", "vlan_id": 100},
+            id="network",
+        ),
+    ])
+    def test_resource_validation(self, cls, kwargs, expected):
+        """Test resource config validation accepts valid input."""
+        obj = cls(**kwargs)
+        for attr, value in expected.items():
+            assert getattr(obj, attr) == value
 
 
 class TestTemplateSystem:
@@ -252,44 +310,43 @@ class TestTemplateSystem:
     
     def test_predefined_templates(self):
         """Test predefined template configurations."""
-        from schemas.template import PREDEFINED_TEMPLATES, TemplateType
-        
         # Test that all predefined templates exist
         assert TemplateType.SMALL in PREDEFINED_TEMPLATES
         assert TemplateType.MEDIUM in PREDEFINED_TEMPLATES
         assert TemplateType.LARGE in PREDEFINED_TEMPLATES
         
         # Test small template configuration
-        small_template = PREDEFINED_TEMPLATES[TemplateType.SMALL]
-        assert small_template.resources.cpu.cores == 1
-        assert small_template.resources.memory.size_mb == 2048
-        assert small_template.resources.disks[0].size_gb == 20.0
+        assert (
+            _SMALL.resources.cpu.cores,
+            _SMALL.resources.memory.size_mb,
+            _SMALL.resources.disks[0].size_gb,
+        ) == (1, 2048, 20.0)
         
         # Test medium template configuration
-        medium_template = PREDEFINED_TEMPLATES[TemplateType.MEDIUM]
-        assert medium_template.resources.cpu.cores == 2
-        assert medium_template.resources.memory.size_mb == 4096
-        assert medium_template.resources.disks[0].size_gb == 40.0
+        assert (
+            _MEDIUM.resources.cpu.cores,
+            _MEDIUM.resources.memory.size_mb,
+            _MEDIUM.resources.disks[0].size_gb,
+        ) == (2, 4096, 40.0)
         
         # Test large template configuration
-        large_template = PREDEFINED_TEMPLATES[TemplateType.LARGE]
-        assert large_template.resources.cpu.cores == 4
-        assert large_template.resources.memory.size_mb == 8192
-        assert large_template.resources.disks[0].size_gb == 80.0
+        assert (
+            _LARGE.resources.cpu.cores,
+            _LARGE.resources.memory.size_mb,
+            _LARGE.resources.disks[0].size_gb,
+        ) == (4, 8192, 80.0)
     
     def test_template_creation(self):
         """Test template creation schema."""
-        from schemas.template import TemplateCreate, TemplateType
-        from schemas.resources import VMResources, CPUConfig, MemoryConfig, DiskConfig, NetworkConfig
-        from models.virtual_machine import OSType
-        
-        # Create complete resource configuration
-        cpu = CPUConfig(cores=2)
-        memory = MemoryConfig(size_mb=2048)
-        disks = [DiskConfig(name="main", size_gb=40.0, format="qcow2", bootable=True)]
-        networks = [NetworkConfig(name="default", type="nat")]
+        # Create complete resource configuration. The resources are only data
+        # carriers here, so they skip validation via model_construct; the
+        # TemplateCreate under test is still fully validated.
+        cpu = CPUConfig.model_construct(cores=2)
+        memory = MemoryConfig.model_construct(size_mb=2048)
+        disks = [DiskConfig.model_construct(name="main", size_gb=40.0, format="qcow2", bootable=True)]
+        networks = [NetworkConfig.model_construct(name="default", type="nat")]
         
-        resources = VMResources(
+        resources = VMResources.model_construct(
             cpu=cpu,
             memory=memory,
             disks=disks,
@@ -1,107 +1,105 @@
 """Tests for VM resource management functionality."""
 
+import functools
+
 import pytest
-import json
-from datetime import datetime
-from sqlalchemy.orm import Session
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy.orm import configure_mappers
 
 from schemas.resources import (
-    CPUConfig, MemoryConfig, DiskConfig, NetworkConfig, VMResources,
-    ResourceLimits, ResourceValidationResult
+    CPUConfig, MemoryConfig, DiskConfig, NetworkConfig, VMResources
 )
-from schemas.template import TemplateCreate, TemplateType
 from core.resource_validator import ResourceValidator
-from models.virtual_machine import VirtualMachine, VMStatus, OSType
 from models.vm_template import VMTemplate
 from models.vm_disk import VMDisk
 from models.vm_network import VMNetwork
-from models.user import User
-from models.server import Server
+
+# Share one xdist worker (and its import graph) with the other vm_service modules
+pytestmark = pytest.mark.xdist_group(name="vm_service")
+
+
+# List validators built once per module rather than per call site
+_DISK_LIST = TypeAdapter(list[DiskConfig])
+_NET_LIST = TypeAdapter(list[NetworkConfig])
+
+@functools.lru_cache(maxsize=None)
+def _disk(name, size_gb, fmt="qcow2", bootable=False):
+    """Shared DiskConfig per argument tuple; safe because the model is frozen."""
+    return DiskConfig(name=name, size_gb=size_gb, format=fmt, bootable=bootable)
+
+
+@functools.lru_cache(maxsize=None)
+def _net(name, type="nat"):
+    """Shared NetworkConfig per argument tuple; safe because the model is frozen."""
+    return NetworkConfig(name=name, type=type)
+
+
+# Canonical resource set, built once without validation. Tests only read it;
+# use ``_RESOURCES.model_copy()`` before mutating.
+_CPU = CPUConfig.model_construct(cores=2)
+_MEM = MemoryConfig.model_construct(size_mb=2048)
+_DISKS = (_disk("main", 20.0, bootable=True),)
+_NETS = (_net("default"),)
+_RESOURCES = VMResources.model_construct(cpu=_CPU, memory=_MEM, disks=list(_DISKS), network=list(_NETS))
+
+
+# (schema, constructor kwargs, attributes to check) per valid configuration
+SCHEMA_CASES = [
+    pytest.param(
+        CPUConfig,
+        dict(cores=4, sockets=1, threads=1),
+        dict(cores=4, sockets=1, threads=1),
+        id="cpu",
+    ),
+    pytest.param(
+        CPUConfig,
+        dict(cores=2, sockets=1, threads=2, model="host-passthrough", pinning=[0, 1], shares=1024, limit=80),
+        dict(model="host-passthrough", pinning=[0, 1], shares=1024, limit=80),
+        id="cpu_advanced",
+    ),
+    pytest.param(
+        MemoryConfig,
+        dict(size_mb=4096, hugepages=True, balloon=False, shares=512),
+        dict(size_mb=4096, hugepages=True, balloon=False, shares=512),
+        id="memory",
+    ),
+    pytest.param(
+        DiskConfig,
+        dict(name="main", size_gb=50.0, format="qcow2", pool="default", cache="writeback", bootable=True),
+        dict(name="main", size_gb=50.0, format="qcow2", bootable=True),
+        id="disk",
+    ),
+    pytest.param(
+        NetworkConfig,
+        dict(name="eth0", type="bridge", bridge="br0", vlan_id=100,
+             ip_address="192.168.1.100", mac_address="52:54:00:12:34:56"),
+        dict(name="eth0", type="bridge", bridge="br0", vlan_id=100, ip_address="192.168.1.100"),
+        id="network",
+    ),
+]
 
 
 class TestResourceSchemas:
     """Test resource configuration schemas."""
     
-    def test_cpu_config_validation(self):
-        """Test CPU configuration validation."""
-        # Valid configuration
-        cpu = CPUConfig(cores=4, sockets=1, threads=1)
-        assert cpu.cores == 4
-        assert cpu.sockets == 1
-        assert cpu.threads == 1
-        
-        # Test with advanced options
-        cpu_advanced = CPUConfig(
-            cores=2,
-            sockets=1,
-            threads=2,
-            model="host-passthrough",
-            pinning=[0, 1],
-            shares=1024,
-            limit=80
-        )
-        assert cpu_advanced.model == "host-passthrough"
-        assert cpu_advanced.pinning == [0, 1]
-        assert cpu_advanced.shares == 1024
-        assert cpu_advanced.limit == 80
-    
-    def test_memory_config_validation(self):
-        """Test memory configuration validation."""
-        memory = MemoryConfig(
-            size_mb=4096,
-            hugepages=True,
-            balloon=False,
-            shares=512
-        )
-        assert memory.size_mb == 4096
-        assert memory.hugepages is True
-        assert memory.balloon is False
-        assert memory.shares == 512
-    
-    def test_disk_config_validation(self):
-        """Test disk configuration validation."""
-        disk = DiskConfig(
-            name="main",
-            size_gb=50.0,
-            format="qcow2",
-            pool="default",
-            cache="writeback",
-            bootable=True
-        )
-        assert disk.name == "main"
-        assert disk.size_gb == 50.0
-        assert disk.format == "qcow2"
-        assert disk.bootable is True
+    @pytest.mark.parametrize("cls,kwargs,expected", SCHEMA_CASES)
+    def test_config_validation(self, cls, kwargs, expected):
+        """Test each config schema accepts valid input and keeps its values."""
+        obj = cls(**kwargs)
+        for attr, value in expected.items():
+            assert getattr(obj, attr) == value
     
-    def test_network_config_validation(self):
-        """Test network configuration validation."""
-        network = NetworkConfig(
-            name="eth0",
-            type="bridge",
-            bridge="br0",
-            vlan_id=100,
-            ip_address="192.168.1.100",
-            mac_address="52:54:00:12:34:56"
-        )
-        assert network.name == "eth0"
-        assert network.type == "bridge"
-        assert network.bridge == "br0"
-        assert network.vlan_id == 100
-        assert network.ip_address == "192.168.1.100"
+    def test_disk_config_is_frozen(self):
+        """Frozen configs are hashable, so the factory can share one instance."""
+        disk = _disk("main", 20.0, bootable=True)
+        assert disk is _DISKS[0]
+        assert hash(disk) == hash(DiskConfig(name="main", size_gb=20.0, format="qcow2", bootable=True))
+        with pytest.raises(ValidationError):
+            disk.size_gb = 40.0
     
     def test_vm_resources_complete(self):
         """Test complete VM resource configuration."""
-        cpu = CPUConfig(cores=2)
-        memory = MemoryConfig(size_mb=2048)
-        disks = [DiskConfig(name="main", size_gb=20.0, format="qcow2", bootable=True)]
-        networks = [NetworkConfig(name="default", type="nat")]
-        
-        resources = VMResources(
-            cpu=cpu,
-            memory=memory,
-            disks=disks,
-            network=networks
-        )
+        resources = _RESOURCES
         
         assert resources.cpu.cores == 2
         assert resources.memory.size_mb == 2048
@@ -114,24 +112,16 @@ class TestTemplateSchemas:
     
     def test_template_create(self):
         """Test template creation schema."""
-        cpu = CPUConfig(cores=1)
-        memory = MemoryConfig(size_mb=1024)
-        disks = [DiskConfig(name="main", size_gb=10.0, format="qcow2", bootable=True)]
-        networks = [NetworkConfig(name="default", type="nat")]
-        
-        resources = VMResources(
-            cpu=cpu,
-            memory=memory,
-            disks=disks,
-            network=networks
-        )
-        
+        from schemas.template import TemplateCreate, TemplateType
+        from models.virtual_machine import OSType
+
+        # Resources are a shared fixture here; TemplateCreate itself is validated
         template = TemplateCreate(
             name="Test Template",
             description="A test template",
             type=TemplateType.SMALL,
             os_type=OSType.LINUX,
-            resources=resources,
+            resources=_RESOURCES,
             tags=["test", "small"],
             public=False
         )
@@ -163,9 +153,9 @@ class TestResourceValidator:
         # Note: This will fail in actual execution due to psutil dependency
         # but shows the intended structure
         
-        # Invalid CPU configuration
-        cpu_invalid = CPUConfig(cores=0, sockets=0, threads=0)
-        # This would show validation errors
+        # Invalid CPU configuration is rejected by the schema itself
+        with pytest.raises(ValidationError):
+            CPUConfig(cores=0, sockets=0, threads=0)
     
     def test_memory_validation(self, mock_db):
         """Test memory configuration validation."""
@@ -175,20 +165,20 @@ class TestResourceValidator:
         memory = MemoryConfig(size_mb=1024)
         # result = validator.validate_memory_config(memory)
         
-        # Invalid memory configuration
-        memory_invalid = MemoryConfig(size_mb=100)  # Too small
-        # This would show validation errors
+        # Invalid memory configuration is rejected by the schema itself
+        with pytest.raises(ValidationError):
+            MemoryConfig(size_mb=100)  # Too small
     
     def test_disk_validation(self, mock_db):
         """Test disk configuration validation."""
         validator = ResourceValidator(mock_db)
         
         # Valid disk configuration
-        disks = [DiskConfig(name="main", size_gb=20.0, format="qcow2", bootable=True)]
+        disks = _DISK_LIST.validate_python([{"name": "main", "size_gb": 20.0, "format": "qcow2", "bootable": True}])
         # result = validator.validate_disk_config(disks)
         
         # Invalid disk configuration - no bootable disk
-        disks_invalid = [DiskConfig(name="data", size_gb=20.0, format="qcow2", bootable=False)]
+        disks_invalid = _DISK_LIST.validate_python([{"name": "data", "size_gb": 20.0, "format": "qcow2", "bootable": False}])
         # This would show validation warnings
     
     def test_network_validation(self, mock_db):
@@ -196,23 +186,37 @@ class TestResourceValidator:
         validator = ResourceValidator(mock_db)
         
         # Valid network configuration
-        networks = [NetworkConfig(name="eth0", type="nat")]
+        networks = _NET_LIST.validate_python([{"name": "eth0", "type": "nat"}])
         # result = validator.validate_network_config(networks)
         
         # Invalid network configuration - duplicate names
-        networks_invalid = [
-            NetworkConfig(name="eth0", type="nat"),
-            NetworkConfig(name="eth0", type="bridge")
-        ]
+        networks_invalid = _NET_LIST.validate_python([
+            {"name": "eth0", "type": "nat"},
+            {"name": "eth0", "type": "bridge"}
+        ])
         # This would show validation errors
 
 
+def _make(cls, **kwargs):
+    """Build a mapped model without SQLAlchemy's instrumented ``__init__``.
+
+    Fine for plain attribute/property checks; the instance has no ORM state
+    and must not be added to a session.
+    """
+    # Instrumented attributes need configured mappers; a no-op once done
+    configure_mappers()
+    obj = object.__new__(cls)
+    obj.__dict__.update(kwargs)
+    return obj
+
+
 class TestDatabaseModels:
     """Test database model functionality."""
     
     def test_vm_disk_model(self):
         """Test VM disk model."""
-        disk = VMDisk(
+        disk = _make(
+            VMDisk,
             vm_id=1,
             name="main",
             size_gb=50.0,
@@ -232,7 +236,8 @@ class TestDatabaseModels:
     
     def test_vm_network_model(self):
         """Test VM network model."""
-        network = VMNetwork(
+        network = _make(
+            VMNetwork,
             vm_id=1,
             name="eth0",
             type="bridge",
@@ -249,6 +254,7 @@ class TestDatabaseModels:
     
     def test_vm_template_model(self):
         """Test VM template model."""
+        # Goes through the real ORM constructor to keep that path covered
         template = VMTemplate(
             name="Test Template",
             description="A test template",
@@ -1,265 +1,280 @@
 """Tests for WebSocket event broadcaster."""
 
+import operator
+
+import orjson
 import pytest
-import asyncio
-from unittest.mock import Mock, AsyncMock, patch
+from unittest.mock import AsyncMock
 from datetime import datetime
 
+import websocket.events as events_mod
 from websocket.events import EventBroadcaster, VMStatusEvent, ProgressEvent, AlertEvent
-from websocket.manager import WebSocketManager
 
+# Share one xdist worker (and its import graph) with the other vm_service modules
+pytestmark = pytest.mark.xdist_group(name="vm_service")
+
+
+class _StubManager:
+    """Minimal stand-in for WebSocketManager with only the broadcast methods.
+
+    Avoids the class introspection ``Mock(spec=WebSocketManager)`` does.
+    """
+    __slots__ = ("broadcast_to_room", "broadcast_to_vm", "broadcast_to_server")
+    
+    def __init__(self):
+        # Built once per module; _reset_mocks only clears their call state
+        self.broadcast_to_room = AsyncMock(return_value=None)
+        self.broadcast_to_vm = AsyncMock(return_value=None)
+        self.broadcast_to_server = AsyncMock(return_value=None)
+
+    def reset(self):
+        """Clear call_args/call_count, keeping the configured return values."""
+        for name in self.__slots__:
+            getattr(self, name).reset_mock(return_value=False, side_effect=False)
 
-@pytest.fixture
+
+@pytest.fixture(scope="module")
 def mock_manager():
     """Create a mock WebSocket manager for testing."""
-    manager = Mock(spec=WebSocketManager)
-    manager.broadcast_to_room = AsyncMock()
-    manager.broadcast_to_vm = AsyncMock()
-    manager.broadcast_to_server = AsyncMock()
-    return manager
+    return _StubManager()
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def broadcaster(mock_manager):
     """Create an EventBroadcaster with mocked manager."""
-    with patch('websocket.events.websocket_manager', mock_manager):
-        return EventBroadcaster()
+    orig = events_mod.websocket_manager
+    events_mod.websocket_manager = mock_manager
+    try:
+        yield EventBroadcaster()
+    finally:
+        events_mod.websocket_manager = orig
+
+
+@pytest.fixture(autouse=True)
+def _reset_mocks(mock_manager):
+    """Clear recorded calls so each test sees fresh call counts."""
+    mock_manager.reset()
+    yield
+
+
+VM_CREATED_DATA = {
+    "id": 1,
+    "name": "new-vm",
+    "uuid": "test-uuid",
+    "status": "running",
+    "server_id": 1
+}
+
+VM_METRICS = {
+    "cpu_usage_percent": 75.5,
+    "memory_usage_percent": 60.2,
+    "memory_used_mb": 1024
+}
+
+SERVER_METRICS = {
+    "cpu_usage_percent": 45.3,
+    "memory_usage_percent": 70.1,
+    "load_average": 2.5,
+    "disk_usage_percent": 85.0
+}
+
+# One row per broadcast scenario: the method and kwargs to call, the room and
+# message type expected on broadcast_to_room, a subset of the message data,
+# and which entity (if any) should also get a targeted vm/server broadcast.
+BROADCAST_CASES = [
+    {
+        "name": "vm_status_change",
+        "method": "broadcast_vm_status_change",
+        "kwargs": {"vm_id": 1, "vm_name": "test-vm", "old_status": "stopped", "new_status": "running"},
+        "room": "vm_status",
+        "type": "vm_status_changed",
+        "data": {"vm_id": 1, "vm_name": "test-vm", "old_status": "stopped", "new_status": "running"},
+        "vm_target": 1,
+        "server_target": None,
+    },
+    {
+        # Only the vm_status room; there are no VM-specific subscribers yet
+        "name": "vm_created",
+        "method": "broadcast_vm_created",
+        "kwargs": {"vm_data": VM_CREATED_DATA},
+        "room": "vm_status",
+        "type": "vm_created",
+        "data": {"vm": VM_CREATED_DATA},
+        "vm_target": None,
+        "server_target": None,
+    },
+    {
+        "name": "vm_deleted",
+        "method": "broadcast_vm_deleted",
+        "kwargs": {"vm_id": 1, "vm_name": "deleted-vm"},
+        "room": "vm_status",
+        "type": "vm_deleted",
+        "data": {"vm_id": 1, "vm_name": "deleted-vm"},
+        "vm_target": 1,
+        "server_target": None,
+    },
+    {
+        "name": "vm_metrics",
+        "method": "broadcast_vm_metrics",
+        "kwargs": {"vm_id": 1, "vm_name": "test-vm", "metrics": VM_METRICS},
+        "room": "vm_metrics",
+        "type": "vm_metrics_update",
+        "data": {"vm_id": 1, "vm_name": "test-vm", "metrics": VM_METRICS},
+        "vm_target": 1,
+        "server_target": None,
+    },
+    {
+        "name": "server_status_change",
+        "method": "broadcast_server_status_change",
+        "kwargs": {"server_id": 1, "hostname": "test-server", "old_status": "offline", "new_status": "online"},
+        "room": "server_status",
+        "type": "server_status_changed",
+        "data": {"server_id": 1, "hostname": "test-server", "old_status": "offline", "new_status": "online"},
+        "vm_target": None,
+        "server_target": 1,
+    },
+    {
+        "name": "server_metrics",
+        "method": "broadcast_server_metrics",
+        "kwargs": {"server_id": 1, "hostname": "test-server", "metrics": SERVER_METRICS},
+        "room": "server_metrics",
+        "type": "server_metrics_update",
+        "data": {"server_id": 1, "hostname": "test-server", "metrics": SERVER_METRICS},
+        "vm_target": None,
+        "server_target": 1,
+    },
+    {
+        "name": "progress_update",
+        "method": "broadcast_progress_update",
+        "kwargs": {
+            "operation_id": "op-123",
+            "operation_type": "vm_creation",
+            "progress_percent": 50,
+            "status": "in_progress",
+            "message": "Creating virtual machine..."
+        },
+        "room": "global",
+        "type": "progress",
+        "data": {
+            "operation_id": "op-123",
+            "operation_type": "vm_creation",
+            "progress_percent": 50,
+            "status": "in_progress",
+            "message": "Creating virtual machine..."
+        },
+        "vm_target": None,
+        "server_target": None,
+    },
+    {
+        "name": "alert_vm_entity",
+        "method": "broadcast_alert",
+        "kwargs": {
+            "alert_id": "alert-456",
+            "alert_type": "resource_warning",
+            "severity": "warning",
+            "title": "High CPU Usage",
+            "message": "CPU usage is above 90%",
+            "entity_type": "vm",
+            "entity_id": 1
+        },
+        "room": "global",
+        "type": "alert",
+        "data": {
+            "alert_id": "alert-456",
+            "alert_type": "resource_warning",
+            "severity": "warning",
+            "title": "High CPU Usage",
+            "message": "CPU usage is above 90%",
+            "entity_type": "vm",
+            "entity_id": 1
+        },
+        "vm_target": 1,
+        "server_target": None,
+    },
+    {
+        "name": "alert_server_entity",
+        "method": "broadcast_alert",
+        "kwargs": {
+            "alert_id": "alert-789",
+            "alert_type": "connectivity",
+            "severity": "error",
+            "title": "Server Unreachable",
+            "message": "Server is not responding",
+            "entity_type": "server",
+            "entity_id": 2
+        },
+        "room": "global",
+        "type": "alert",
+        "data": {"alert_id": "alert-789", "entity_type": "server", "entity_id": 2},
+        "vm_target": None,
+        "server_target": 2,
+    },
+    {
+        # General system alert: global room only
+        "name": "alert_no_entity",
+        "method": "broadcast_alert",
+        "kwargs": {
+            "alert_id": "alert-general",
+            "alert_type": "system",
+            "severity": "info",
+            "title": "System Update",
+            "message": "System maintenance scheduled"
+        },
+        "room": "global",
+        "type": "alert",
+        "data": {"alert_id": "alert-general", "severity": "info"},
+        "vm_target": None,
+        "server_target": None,
+    },
+]
+
+
+# Expected to_dict() payloads for test_event_data_classes
+_EXPECTED_VM_STATUS = {
+    "vm_id": 1,
+    "vm_name": "test-vm",
+    "old_status": "stopped",
+    "new_status": "running",
+    "timestamp": "2024-01-01T00:00:00Z"
+}
+_EXPECTED_PROGRESS = {"operation_id": "op-123", "progress_percent": 75, "message": "Almost done..."}
+_EXPECTED_ALERT = {"alert_id": "alert-123", "severity": "high", "entity_type": "vm", "entity_id": 1}
+
+# Pull the expected keys out of to_dict() as one tuple
+_VM_STATUS_GET = operator.itemgetter(*_EXPECTED_VM_STATUS)
+_PROGRESS_GET = operator.itemgetter(*_EXPECTED_PROGRESS)
+_ALERT_GET = operator.itemgetter(*_EXPECTED_ALERT)
 
 
 class TestEventBroadcaster:
     """Test event broadcasting functionality."""
     
-    async def test_broadcast_vm_status_change(self, broadcaster, mock_manager):
-        """Test broadcasting VM status change events."""
-        await broadcaster.broadcast_vm_status_change(
-            vm_id=1,
-            vm_name="test-vm",
-            old_status="stopped",
-            new_status="running"
-        )
-        
-        # Should broadcast to both vm_status room and VM-specific subscribers
-        assert mock_manager.broadcast_to_room.call_count == 1
-        assert mock_manager.broadcast_to_vm.call_count == 1
+    @pytest.mark.parametrize("case", BROADCAST_CASES, ids=lambda case: case["name"])
+    async def test_broadcast(self, broadcaster, mock_manager, case):
+        """Test each broadcast reaches its room and any entity-specific subscribers."""
+        await getattr(broadcaster, case["method"])(**case["kwargs"])
         
         # Check the room broadcast
-        room_call = mock_manager.broadcast_to_room.call_args
-        assert room_call[0][0] == "vm_status"
-        message = room_call[0][1]
-        assert message["type"] == "vm_status_changed"
-        assert message["data"]["vm_id"] == 1
-        assert message["data"]["vm_name"] == "test-vm"
-        assert message["data"]["old_status"] == "stopped"
-        assert message["data"]["new_status"] == "running"
-        
-        # Check the VM-specific broadcast
-        vm_call = mock_manager.broadcast_to_vm.call_args
-        assert vm_call[0][0] == 1
-        assert vm_call[0][1]["type"] == "vm_status_changed"
-    
-    async def test_broadcast_vm_created(self, broadcaster, mock_manager):
-        """Test broadcasting VM creation events."""
-        vm_data = {
-            "id": 1,
-            "name": "new-vm",
-            "uuid": "test-uuid",
-            "status": "running",
-            "server_id": 1
-        }
-        
-        await broadcaster.broadcast_vm_created(vm_data)
-        
-        # Should broadcast only to vm_status room (not VM-specific since it's new)
-        assert mock_manager.broadcast_to_room.call_count == 1
-        assert mock_manager.broadcast_to_vm.call_count == 0
-        
-        room_call = mock_manager.broadcast_to_room.call_args
-        assert room_call[0][0] == "vm_status"
-        message = room_call[0][1]
-        assert message["type"] == "vm_created"
-        assert message["data"]["vm"] == vm_data
-    
-    async def test_broadcast_vm_deleted(self, broadcaster, mock_manager):
-        """Test broadcasting VM deletion events."""
-        await broadcaster.broadcast_vm_deleted(vm_id=1, vm_name="deleted-vm")
-        
-        # Should broadcast to both vm_status room and VM-specific subscribers
-        assert mock_manager.broadcast_to_room.call_count == 1
-        assert mock_manager.broadcast_to_vm.call_count == 1
-        
-        room_call = mock_manager.broadcast_to_room.call_args
-        message = room_call[0][1]
-        assert message["type"] == "vm_deleted"
-        assert message["data"]["vm_id"] == 1
-        assert message["data"]["vm_name"] == "deleted-vm"
-    
-    async def test_broadcast_vm_metrics(self, broadcaster, mock_manager):
-        """Test broadcasting VM metrics updates."""
-        metrics = {
-            "cpu_usage_percent": 75.5,
-            "memory_usage_percent": 60.2,
-            "memory_used_mb": 1024
-        }
-        
-        await broadcaster.broadcast_vm_metrics(
-            vm_id=1,
-            vm_name="test-vm",
-            metrics=metrics
-        )
-        
-        # Should broadcast to both vm_metrics room and VM-specific subscribers
-        assert mock_manager.broadcast_to_room.call_count == 1
-        assert mock_manager.broadcast_to_vm.call_count == 1
-        
-        room_call = mock_manager.broadcast_to_room.call_args
-        assert room_call[0][0] == "vm_metrics"
-        message = room_call[0][1]
-        assert message["type"] == "vm_metrics_update"
-        assert message["data"]["vm_id"] == 1
-        assert message["data"]["vm_name"] == "test-vm"
-        assert message["data"]["metrics"] == metrics
-    
-    async def test_broadcast_server_status_change(self, broadcaster, mock_manager):
-        """Test broadcasting server status change events."""
-        await broadcaster.broadcast_server_status_change(
-            server_id=1,
-            hostname="test-server",
-            old_status="offline",
-            new_status="online"
-        )
-        
-        # Should broadcast to both server_status room and server-specific subscribers
-        assert mock_manager.broadcast_to_room.call_count == 1
-        assert mock_manager.broadcast_to_server.call_count == 1
-        
-        room_call = mock_manager.broadcast_to_room.call_args
-        assert room_call[0][0] == "server_status"
-        message = room_call[0][1]
-        assert message["type"] == "server_status_changed"
-        assert message["data"]["server_id"] == 1
-        assert message["data"]["hostname"] == "test-server"
-        assert message["data"]["old_status"] == "offline"
-        assert message["data"]["new_status"] == "online"
-    
-    async def test_broadcast_server_metrics(self, broadcaster, mock_manager):
-        """Test broadcasting server metrics updates."""
-        metrics = {
-            "cpu_usage_percent": 45.3,
-            "memory_usage_percent": 70.1,
-            "load_average": 2.5,
-            "disk_usage_percent": 85.0
-        }
-        
-        await broadcaster.broadcast_server_metrics(
-            server_id=1,
-            hostname="test-server",
-            metrics=metrics
-        )
-        
-        # Should broadcast to both server_metrics room and server-specific subscribers
-        assert mock_manager.broadcast_to_room.call_count == 1
-        assert mock_manager.broadcast_to_server.call_count == 1
-        
-        room_call = mock_manager.broadcast_to_room.call_args
-        assert room_call[0][0] == "server_metrics"
-        message = room_call[0][1]
-        assert message["type"] == "server_metrics_update"
-        assert message["data"]["server_id"] == 1
-        assert message["data"]["hostname"] == "test-server"
-        assert message["data"]["metrics"] == metrics
-    
-    async def test_broadcast_progress_update(self, broadcaster, mock_manager):
-        """Test broadcasting progress updates."""
-        await broadcaster.broadcast_progress_update(
-            operation_id="op-123",
-            operation_type="vm_creation",
-            progress_percent=50,
-            status="in_progress",
-            message="Creating virtual machine..."
-        )
-        
-        # Should broadcast to global room
-        assert mock_manager.broadcast_to_room.call_count == 1
-        
-        room_call = mock_manager.broadcast_to_room.call_args
-        assert room_call[0][0] == "global"
-        message = room_call[0][1]
-        assert message["type"] == "progress"
-        assert message["data"]["operation_id"] == "op-123"
-        assert message["data"]["operation_type"] == "vm_creation"
-        assert message["data"]["progress_percent"] == 50
-        assert message["data"]["status"] == "in_progress"
-        assert message["data"]["message"] == "Creating virtual machine..."
-    
-    async def test_broadcast_alert(self, broadcaster, mock_manager):
-        """Test broadcasting system alerts."""
-        await broadcaster.broadcast_alert(
-            alert_id="alert-456",
-            alert_type="resource_warning",
-            severity="warning",
-            title="High CPU Usage",
-            message="CPU usage is above 90%",
-            entity_type="vm",
-            entity_id=1
-        )
-        
-        # Should broadcast to global room and VM-specific subscribers
         assert mock_manager.broadcast_to_room.call_count == 1
-        assert mock_manager.broadcast_to_vm.call_count == 1
-        
-        # Check global broadcast
         room_call = mock_manager.broadcast_to_room.call_args
-        assert room_call[0][0] == "global"
+        assert room_call[0][0] == case["room"]
         message = room_call[0][1]
-        assert message["type"] == "alert"
-        assert message["data"]["alert_id"] == "alert-456"
-        assert message["data"]["alert_type"] == "resource_warning"
-        assert message["data"]["severity"] == "warning"
-        assert message["data"]["title"] == "High CPU Usage"
-        assert message["data"]["message"] == "CPU usage is above 90%"
-        assert message["data"]["entity_type"] == "vm"
-        assert message["data"]["entity_id"] == 1
-        
-        # Check VM-specific broadcast
-        vm_call = mock_manager.broadcast_to_vm.call_args
-        assert vm_call[0][0] == 1
-        assert vm_call[0][1]["type"] == "alert"
-    
-    async def test_broadcast_alert_server_entity(self, broadcaster, mock_manager):
-        """Test broadcasting alert for server entity."""
-        await broadcaster.broadcast_alert(
-            alert_id="alert-789",
-            alert_type="connectivity",
-            severity="error",
-            title="Server Unreachable",
-            message="Server is not responding",
-            entity_type="server",
-            entity_id=2
-        )
+        assert message["type"] == case["type"]
+        assert case["data"].items() <= message["data"].items()
+        # The manager sends JSON; the payload must survive encoding unchanged
+        assert orjson.loads(orjson.dumps(message)) == message
         
-        # Should broadcast to global room and server-specific subscribers
-        assert mock_manager.broadcast_to_room.call_count == 1
-        assert mock_manager.broadcast_to_server.call_count == 1
-        assert mock_manager.broadcast_to_vm.call_count == 0
-        
-        # Check server-specific broadcast
-        server_call = mock_manager.broadcast_to_server.call_args
-        assert server_call[0][0] == 2
-    
-    async def test_broadcast_alert_no_entity(self, broadcaster, mock_manager):
-        """Test broadcasting general system alert."""
-        await broadcaster.broadcast_alert(
-            alert_id="alert-general",
-            alert_type="system",
-            severity="info",
-            title="System Update",
-            message="System maintenance scheduled"
-        )
-        
-        # Should only broadcast to global room
-        assert mock_manager.broadcast_to_room.call_count == 1
-        assert mock_manager.broadcast_to_vm.call_count == 0
-        assert mock_manager.broadcast_to_server.call_count == 0
+        # Check the VM/server-specific broadcasts
+        for target, mock in (
+            (case["vm_target"], mock_manager.broadcast_to_vm),
+            (case["server_target"], mock_manager.broadcast_to_server),
+        ):
+            if target is None:
+                assert mock.call_count == 0
+            else:
+                assert mock.call_count == 1
+                assert mock.call_args[0][0] == target
+                assert mock.call_args[0][1]["type"] == case["type"]
     
     def test_event_data_classes(self):
         """Test event data class functionality."""
@@ -273,11 +288,7 @@ class TestEventBroadcaster:
         )
         
         vm_dict = vm_event.to_dict()
-        assert vm_dict["vm_id"] == 1
-        assert vm_dict["vm_name"] == "test-vm"
-        assert vm_dict["old_status"] == "stopped"
-        assert vm_dict["new_status"] == "running"
-        assert vm_dict["timestamp"] == "2024-01-01T00:00:00Z"
+        assert _VM_STATUS_GET(vm_dict) == tuple(_EXPECTED_VM_STATUS.values())
         
         # Test ProgressEvent
         progress_event = ProgressEvent(
@@ -290,9 +301,7 @@ class TestEventBroadcaster:
         )
         
         progress_dict = progress_event.to_dict()
-        assert progress_dict["operation_id"] == "op-123"
-        assert progress_dict["progress_percent"] == 75
-        assert progress_dict["message"] == "Almost done..."
+        assert _PROGRESS_GET(progress_dict) == tuple(_EXPECTED_PROGRESS.values())
         
         # Test AlertEvent
         alert_event = AlertEvent(
@@ -307,7 +316,4 @@ class TestEventBroadcaster:
         )
         
         alert_dict = alert_event.to_dict()
-        assert alert_dict["alert_id"] == "alert-123"
-        assert alert_dict["severity"] == "high"
-        assert alert_dict["entity_type"] == "vm"
-        assert alert_dict["entity_id"] == 1
\ No newline at end of file
+        assert _ALERT_GET(alert_dict) == tuple(_EXPECTED_ALERT.values())
@@ -2,11 +2,10 @@
 
 import pytest
 import asyncio
-from unittest.mock import Mock, AsyncMock
+import json
 from datetime import datetime
 
 from websocket.manager import WebSocketManager, ConnectionInfo
-from models.user import User
 
 
 @pytest.fixture
@@ -15,23 +14,47 @@ def manager():
     return WebSocketManager()
 
 
+class FakeWS:
+    """Plain stand-in for a WebSocket that records what it is sent.
+    
+    Cheaper than a Mock with AsyncMock methods. Tests needing a slow or
+    failing socket set ``on_send``, awaited after each frame is recorded.
+    """
+    __slots__ = ("sent", "accepted", "closed", "on_send")
+    
+    def __init__(self):
+        self.sent = []
+        self.accepted = False
+        self.closed = False
+        self.on_send = None
+    
+    async def accept(self):
+        self.accepted = True
+    
+    async def send_text(self, data):
+        self.sent.append(data)
+        if self.on_send is not None:
+            await self.on_send(data)
+    
+    async def close(self, code=1000, reason=None):
+        self.closed = True
+
+
+def _last(ws):
+    """Decode the most recent frame sent to a FakeWS."""
+    return json.loads(ws.sent[-1])
+
+
 @pytest.fixture
 def mock_websocket():
-    """Create a mock WebSocket for testing."""
-    websocket = Mock()
-    websocket.accept = AsyncMock()
-    websocket.send_text = AsyncMock()
-    websocket.close = AsyncMock()
-    return websocket
+    """Create a fake WebSocket for testing."""
+    return FakeWS()
 
 
 @pytest.fixture
 def mock_user():
-    """Create a mock User for testing."""
-    user = Mock(spec=User)
-    user.id = 1
-    user.username = "testuser"
-    return user
+    """Create an SSO user dict, as get_websocket_user returns."""
+    return {"id": 1, "username": "testuser"}
 
 
 class TestWebSocketManager:
@@ -46,8 +69,8 @@ class TestWebSocketManager:
         assert manager.connections[connection_id].user is None
         assert connection_id in manager.rooms["global"]
         
-        mock_websocket.accept.assert_called_once()
-        mock_websocket.send_text.assert_called_once()
+        assert mock_websocket.accepted
+        assert len(mock_websocket.sent) == 1
     
     async def test_connect_authenticated(self, manager, mock_websocket, mock_user):
         """Test connecting an authenticated user."""
@@ -58,17 +81,17 @@ class TestWebSocketManager:
         assert manager.connections[connection_id].user == mock_user
         assert connection_id in manager.rooms["global"]
         
-        mock_websocket.accept.assert_called_once()
+        assert mock_websocket.accepted
     
-    def test_disconnect(self, manager, mock_websocket):
+    async def test_disconnect(self, manager, mock_websocket):
         """Test disconnecting a user."""
         # First connect
-        loop = asyncio.get_event_loop()
-        connection_id = loop.run_until_complete(manager.connect(mock_websocket))
+        connection_id = await manager.connect(mock_websocket)
         
         # Subscribe to some rooms
         manager.subscribe_to_room(connection_id, "vm_status")
         manager.subscribe_to_vm(connection_id, 1)
+        manager.subscribe_to_server(connection_id, 2)
         
         # Then disconnect
         manager.disconnect(connection_id)
@@ -76,8 +99,25 @@ class TestWebSocketManager:
         assert connection_id not in manager.connections
         assert connection_id not in manager.rooms["global"]
         assert connection_id not in manager.rooms["vm_status"]
-        if 1 in manager.vm_rooms:
-            assert connection_id not in manager.vm_rooms[1]
+        # Emptied entity rooms are dropped
+        assert 1 not in manager.vm_rooms
+        assert 2 not in manager.server_rooms
+    
+    async def test_connection_info_is_recycled(self, manager, mock_websocket):
+        """Test a disconnected ConnectionInfo is reused with clean state."""
+        old_id = await manager.connect(mock_websocket)
+        old_info = manager.connections[old_id]
+        manager.subscribe_to_vm(old_id, 1)
+        manager.disconnect(old_id)
+        
+        mock_websocket2 = FakeWS()
+        new_id = await manager.connect(mock_websocket2)
+        new_info = manager.connections[new_id]
+        
+        assert new_info is old_info
+        assert new_info.websocket is mock_websocket2
+        assert new_info.subscriptions == {"global"}
+        assert not new_info.vm_subscriptions
     
     async def test_send_to_connection(self, manager, mock_websocket):
         """Test sending message to specific connection."""
@@ -87,10 +127,9 @@ class TestWebSocketManager:
         result = await manager.send_to_connection(connection_id, message)
         
         assert result is True
-        mock_websocket.send_text.assert_called()
+        assert mock_websocket.sent, "no messages sent"
         # Verify the message was JSON serialized
-        call_args = mock_websocket.send_text.call_args[0][0]
-        assert '"type": "test"' in call_args
+        assert _last(mock_websocket) == message
     
     async def test_send_to_nonexistent_connection(self, manager):
         """Test sending message to non-existent connection."""
@@ -99,14 +138,27 @@ class TestWebSocketManager:
         
         assert result is False
     
+    async def test_unserializable_message_keeps_connection(self, manager, mock_websocket):
+        """Test a message orjson rejects is dropped without disconnecting."""
+        connection_id = await manager.connect(mock_websocket)
+        manager.subscribe_to_vm(connection_id, 1)
+        sent_before = len(mock_websocket.sent)
+        
+        for message in ({"type": "test", "data": {"value": 2 ** 70}}, {"type": "test", "data": object()}):
+            assert await manager.send_to_connection(connection_id, message) is False
+            await manager.broadcast_to_room("global", message)
+            await manager.broadcast_to_vm(1, message)
+        
+        assert len(mock_websocket.sent) == sent_before
+        assert connection_id in manager.connections
+        assert await manager.send_to_connection(connection_id, {"type": "test"}) is True
+    
     async def test_broadcast_to_room(self, manager, mock_websocket):
         """Test broadcasting to a room."""
         # Connect two clients
         connection_id1 = await manager.connect(mock_websocket)
         
-        mock_websocket2 = Mock()
-        mock_websocket2.accept = AsyncMock()
-        mock_websocket2.send_text = AsyncMock()
+        mock_websocket2 = FakeWS()
         connection_id2 = await manager.connect(mock_websocket2)
         
         # Subscribe both to vm_status
@@ -116,9 +168,100 @@ class TestWebSocketManager:
         message = {"type": "vm_status", "data": {"vm_id": 1, "status": "running"}}
         await manager.broadcast_to_room("vm_status", message)
         
-        # Both should have received the message
-        assert mock_websocket.send_text.call_count >= 1
-        assert mock_websocket2.send_text.call_count >= 1
+        # Both should have received the message, serialized only once
+        assert _last(mock_websocket) == message
+        assert mock_websocket.sent[-1] is mock_websocket2.sent[-1]
+    
+    async def test_broadcast_tolerates_membership_changes(self, manager, mock_websocket):
+        """Test rooms can change while a broadcast is still sending."""
+        connection_id1 = await manager.connect(mock_websocket)
+        mock_websocket2 = FakeWS()
+        connection_id2 = await manager.connect(mock_websocket2)
+        
+        async def churn(frame):
+            manager.disconnect(connection_id2)
+            await manager.connect(FakeWS())
+        
+        mock_websocket.on_send = churn
+        
+        await manager.broadcast_to_room("global", {"type": "test", "data": {}})
+        
+        assert connection_id1 in manager.rooms["global"]
+        assert connection_id2 not in manager.rooms["global"]
+        assert len(manager.rooms["global"]) == 2
+    
+    async def test_broadcast_drops_failed_connections(self, manager, mock_websocket):
+        """Test a failing subscriber is disconnected without blocking the others."""
+        live_id = await manager.connect(mock_websocket)
+        
+        dead_websocket = FakeWS()
+        dead_id = await manager.connect(dead_websocket)
+        
+        async def fail(frame):
+            raise ConnectionError("socket closed")
+        
+        dead_websocket.on_send = fail
+        
+        await manager.broadcast_to_room("global", {"type": "test", "data": {}})
+        
+        assert live_id in manager.connections
+        assert dead_id not in manager.connections
+        assert dead_id not in manager.rooms["global"]
+        assert len(mock_websocket.sent) == 2  # connect message + broadcast
+    
+    async def test_messages_coalesce_while_sending(self, manager, mock_websocket):
+        """Test messages queued during an in-flight send go out as one array frame."""
+        connection_id = await manager.connect(mock_websocket)
+        
+        mock_websocket.sent.clear()
+        release = asyncio.Event()
+        
+        async def slow_send(frame):
+            if len(mock_websocket.sent) == 1:
+                await release.wait()
+        
+        mock_websocket.on_send = slow_send
+        
+        first = asyncio.create_task(manager.send_to_connection(connection_id, {"type": "a"}))
+        await asyncio.sleep(0)
+        queued = [
+            await manager.send_to_connection(connection_id, {"type": t})
+            for t in ("b", "c")
+        ]
+        release.set()
+        
+        assert await first is True
+        assert queued == [True, True]
+        assert [json.loads(frame) for frame in mock_websocket.sent] == [
+            {"type": "a"},
+            [{"type": "b"}, {"type": "c"}],
+        ]
+    
+    async def test_stalled_connection_keeps_newest_messages(self, manager, mock_websocket, monkeypatch):
+        """Test the outbox behind a stalled send is bounded and drops the oldest."""
+        monkeypatch.setattr("websocket.manager.MAX_OUTBOX_SIZE", 2)
+        connection_id = await manager.connect(mock_websocket)
+        
+        mock_websocket.sent.clear()
+        release = asyncio.Event()
+        
+        async def slow_send(frame):
+            if len(mock_websocket.sent) == 1:
+                await release.wait()
+        
+        mock_websocket.on_send = slow_send
+        
+        first = asyncio.create_task(manager.send_to_connection(connection_id, {"type": "a"}))
+        await asyncio.sleep(0)
+        for t in ("b", "c", "d"):
+            await manager.send_to_connection(connection_id, {"type": t})
+        release.set()
+        await first
+        
+        assert [json.loads(frame) for frame in mock_websocket.sent] == [
+            {"type": "a"},
+            [{"type": "c"}, {"type": "d"}],
+        ]
     
     async def test_broadcast_to_vm(self, manager, mock_websocket):
         """Test broadcasting to VM-specific subscribers."""
@@ -129,7 +272,7 @@ class TestWebSocketManager:
         await manager.broadcast_to_vm(1, message)
         
         # Should have received the message
-        assert mock_websocket.send_text.call_count >= 1
+        assert _last(mock_websocket) == message
     
     async def test_broadcast_to_server(self, manager, mock_websocket):
         """Test broadcasting to server-specific subscribers."""
@@ -140,12 +283,11 @@ class TestWebSocketManager:
         await manager.broadcast_to_server(1, message)
         
         # Should have received the message
-        assert mock_websocket.send_text.call_count >= 1
+        assert _last(mock_websocket) == message
     
-    def test_subscribe_to_room(self, manager, mock_websocket):
+    async def test_subscribe_to_room(self, manager, mock_websocket):
         """Test subscribing to a room."""
-        loop = asyncio.get_event_loop()
-        connection_id = loop.run_until_complete(manager.connect(mock_websocket))
+        connection_id = await manager.connect(mock_websocket)
         
         result = manager.subscribe_to_room(connection_id, "test_room")
         
@@ -153,10 +295,9 @@ class TestWebSocketManager:
         assert connection_id in manager.rooms["test_room"]
         assert "test_room" in manager.connections[connection_id].subscriptions
     
-    def test_subscribe_to_vm(self, manager, mock_websocket):
+    async def test_subscribe_to_vm(self, manager, mock_websocket):
         """Test subscribing to VM-specific updates."""
-        loop = asyncio.get_event_loop()
-        connection_id = loop.run_until_complete(manager.connect(mock_websocket))
+        connection_id = await manager.connect(mock_websocket)
         
         result = manager.subscribe_to_vm(connection_id, 1)
         
@@ -164,10 +305,9 @@ class TestWebSocketManager:
         assert connection_id in manager.vm_rooms[1]
         assert 1 in manager.connections[connection_id].vm_subscriptions
     
-    def test_subscribe_to_server(self, manager, mock_websocket):
+    async def test_subscribe_to_server(self, manager, mock_websocket):
         """Test subscribing to server-specific updates."""
-        loop = asyncio.get_event_loop()
-        connection_id = loop.run_until_complete(manager.connect(mock_websocket))
+        connection_id = await manager.connect(mock_websocket)
         
         result = manager.subscribe_to_server(connection_id, 1)
         
@@ -175,6 +315,25 @@ class TestWebSocketManager:
         assert connection_id in manager.server_rooms[1]
         assert 1 in manager.connections[connection_id].server_subscriptions
     
+    async def test_unsubscribe_from_vm_and_server(self, manager, mock_websocket):
+        """Test unsubscribing drops entity rooms once they are empty."""
+        connection_id = await manager.connect(mock_websocket)
+        other_id = await manager.connect(FakeWS())
+        manager.subscribe_to_vm(connection_id, 1)
+        manager.subscribe_to_vm(other_id, 1)
+        manager.subscribe_to_server(connection_id, 2)
+        
+        assert manager.unsubscribe_from_vm(connection_id, 1) is True
+        assert manager.vm_rooms[1] == {other_id}
+        assert 1 not in manager.connections[connection_id].vm_subscriptions
+        
+        manager.unsubscribe_from_vm(other_id, 1)
+        assert 1 not in manager.vm_rooms
+        
+        assert manager.unsubscribe_from_server(connection_id, 2) is True
+        assert 2 not in manager.server_rooms
+        assert not manager.connections[connection_id].server_subscriptions
+    
     async def test_handle_subscribe_message(self, manager, mock_websocket):
         """Test handling subscription messages."""
         connection_id = await manager.connect(mock_websocket)
@@ -196,6 +355,12 @@ class TestWebSocketManager:
         assert connection_id in manager.vm_rooms[1]
         assert connection_id in manager.vm_rooms[2]
         assert connection_id in manager.server_rooms[1]
+        
+        # The connection records them too, so disconnect can unwind them
+        info = manager.connections[connection_id]
+        assert info.subscriptions == {"global", "vm_status", "vm_metrics"}
+        assert info.vm_subscriptions == {1, 2}
+        assert info.server_subscriptions == {1}
     
     async def test_handle_ping_message(self, manager, mock_websocket):
         """Test handling ping messages."""
@@ -205,24 +370,25 @@ class TestWebSocketManager:
         await manager.handle_message(connection_id, message)
         
         # Should have sent a pong response
-        assert mock_websocket.send_text.call_count >= 2  # connect message + pong
+        assert len(mock_websocket.sent) == 2  # connect message + pong
+        pong = _last(mock_websocket)
+        assert pong["type"] == "pong"
+        datetime.fromisoformat(pong["data"]["timestamp"])
     
-    def test_get_connection_count(self, manager, mock_websocket):
+    async def test_get_connection_count(self, manager, mock_websocket):
         """Test getting connection count."""
         assert manager.get_connection_count() == 0
         
-        loop = asyncio.get_event_loop()
-        connection_id = loop.run_until_complete(manager.connect(mock_websocket))
+        connection_id = await manager.connect(mock_websocket)
         
         assert manager.get_connection_count() == 1
         
         manager.disconnect(connection_id)
         assert manager.get_connection_count() == 0
     
-    def test_get_room_stats(self, manager, mock_websocket):
+    async def test_get_room_stats(self, manager, mock_websocket):
         """Test getting room statistics."""
-        loop = asyncio.get_event_loop()
-        connection_id = loop.run_until_complete(manager.connect(mock_websocket))
+        connection_id = await manager.connect(mock_websocket)
         
         manager.subscribe_to_room(connection_id, "vm_status")
         manager.subscribe_to_room(connection_id, "vm_metrics")
@@ -231,4 +397,11 @@ class TestWebSocketManager:
         
         assert stats["global"] == 1
         assert stats["vm_status"] == 1
-        assert stats["vm_metrics"] == 1
\ No newline at end of file
+        assert stats["vm_metrics"] == 1
+        
+        # Stats follow membership changes
+        manager.unsubscribe_from_room(connection_id, "vm_status")
+        assert manager.get_room_stats()["vm_status"] == 0
+        
+        manager.disconnect(connection_id)
+        assert manager.get_room_stats()["global"] == 0